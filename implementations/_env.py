@@ -0,0 +1,27 @@
+"""
+Shared loader for the mini-swe-agent .env used by the SWE-bench scripts.
+"""
+
+import functools
+import os
+from pathlib import Path
+
+CONFIG_PATH = Path.home() / ".config" / "mini-swe-agent" / ".env"
+
+
+@functools.lru_cache(maxsize=1)
+def load_api_config() -> dict:
+    """Parse the .env once per process and export it to os.environ."""
+    config = {}
+    if CONFIG_PATH.exists():
+        for line in CONFIG_PATH.read_text().splitlines():
+            line = line.strip()
+            if not line or line.startswith('#') or '=' not in line:
+                continue
+            key, value = line.split('=', 1)
+            value = value.strip()
+            if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+                value = value[1:-1]
+            config[key.strip()] = value
+    os.environ.update(config)
+    return config
@@ -0,0 +1,26 @@
+"""
+Shared JSON helpers for the benchmark scripts: orjson when installed, stdlib json otherwise.
+"""
+
+import json
+
+try:
+    import orjson
+
+    def json_dumps(obj, indent: bool = False) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+
+    def canonical_json(obj) -> str:
+        """Compact, sorted-key form, identical for equal objects."""
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS).decode()
+
+    json_loads = orjson.loads
+except ImportError:  # orjson is optional; the fallback emits the same canonical form
+    def json_dumps(obj, indent: bool = False) -> bytes:
+        return json.dumps(obj, indent=2 if indent else None).encode()
+
+    def canonical_json(obj) -> str:
+        """Compact, sorted-key form, identical for equal objects."""
+        return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+    json_loads = json.loads
@@ -0,0 +1,37 @@
+"""
+Shared SWE-bench helpers for the benchmark scripts.
+"""
+
+from pathlib import Path
+
+from _jsonutil import json_dumps, json_loads
+
+INSTANCE_CACHE = Path.home() / ".cache" / "nano-opencode"
+
+
+def load_instances(n: int, dataset: str = "princeton-nlp/SWE-bench_Lite", split: str = "dev") -> list:
+    """Load the first n instances, cached locally so reruns skip the HF download."""
+    cache = INSTANCE_CACHE / f"{dataset.replace('/', '__')}.{split}.{n}.json"
+    if cache.exists():
+        return json_loads(cache.read_bytes())
+    from datasets import load_dataset  # slow to import; a cache hit never needs it
+    ds = load_dataset(dataset, split=split)
+    # select() is a zero-copy view of the memory-mapped split; only those rows are decoded
+    instances = ds.select(range(min(n, len(ds)))).to_list()
+    cache.parent.mkdir(parents=True, exist_ok=True)
+    cache.write_bytes(json_dumps(instances))
+    return instances
+
+
+def load_jsonl(path: Path) -> dict:
+    """Read per-instance results appended by an earlier run, keyed by instance_id."""
+    if not path.exists():
+        return {}
+    done = {}
+    for line in path.read_bytes().splitlines():
+        try:
+            row = json_loads(line)
+        except ValueError:  # partial line from an interrupted write
+            continue
+        done[row["instance_id"]] = row
+    return done
@@ -4,26 +4,29 @@ Agent Version Comparison on SWE-bench
 Tests different system prompts and analyzes results.
 """
 
-import json
+import asyncio
+import functools
 import os
+import posixpath
 import subprocess
+import tempfile
 import time
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Optional
 
 import litellm
-from datasets import load_dataset
 
-litellm.set_verbose = False
+from _env import load_api_config
+from _jsonutil import json_dumps, json_loads
+from _swebench import load_instances, load_jsonl
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional; only needed for --compress
+    zstandard = None
 
-# Load API config
-def load_api_config():
-    config_path = Path.home() / ".config" / "mini-swe-agent" / ".env"
-    if config_path.exists():
-        for line in config_path.read_text().splitlines():
-            if '=' in line and not line.startswith('#'):
-                key, value = line.split('=', 1)
-                os.environ[key.strip()] = value.strip()
+litellm.set_verbose = False
 
 load_api_config()
 
@@ -80,64 +83,117 @@ TOOLS = [
      "input_schema": {"type": "object", "properties": {"summary": {"type": "string"}}, "required": ["summary"]}},
 ]
 
+# OpenAI-format schema for litellm, built once
+OPENAI_TOOLS = [{"type": "function", "function": {"name": t["name"], "description": t["description"], "parameters": t["input_schema"]}} for t in TOOLS]
+
 # ============================================================================
 # DOCKER ENVIRONMENT
 # ============================================================================
 
+async def _run(args: list[str], timeout: float) -> tuple[int, str, str]:
+    """Run a subprocess without blocking the event loop."""
+    proc = await asyncio.create_subprocess_exec(*args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    try:
+        out, err = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise
+    return proc.returncode, out.decode(errors="replace"), err.decode(errors="replace")
+
 @dataclass
 class DockerEnv:
     container_id: str = ""
+    workdir: str = "/testbed"
     timeout: int = 120
 
-    def start(self, image: str):
+    async def start(self, image: str):
         import uuid
         name = f"nano-cmp-{uuid.uuid4().hex[:8]}"
-        result = subprocess.run(
-            ["docker", "run", "-d", "--name", name, "-w", "/testbed", "--rm", image, "sleep", "2h"],
-            capture_output=True, text=True, timeout=300
+        code, out, err = await _run(
+            ["docker", "run", "-d", "--name", name, "-w", self.workdir, "--rm", image, "sleep", "2h"], timeout=300
         )
-        if result.returncode != 0:
-            raise RuntimeError(f"Failed to start: {result.stderr}")
-        self.container_id = result.stdout.strip()
-
-    def execute(self, cmd: str) -> dict:
+        if code != 0:
+            raise RuntimeError(f"Failed to start: {err}")
+        self.container_id = out.strip()
+
+    async def execute(self, cmd: str) -> dict:
+        # `timeout` also kills the command inside the container; killing only the
+        # docker client would leave it running in a container that gets reused
+        args = ["docker", "exec", self.container_id, "timeout", "-k", "5", str(self.timeout), "bash", "-c", cmd]
         try:
-            r = subprocess.run(["docker", "exec", self.container_id, "bash", "-c", cmd],
-                               capture_output=True, text=True, timeout=self.timeout)
-            return {"output": r.stdout + r.stderr, "returncode": r.returncode}
-        except subprocess.TimeoutExpired:
+            code, out, err = await _run(args, timeout=self.timeout + 15)
+        except asyncio.TimeoutError:
             return {"output": f"Timeout after {self.timeout}s", "returncode": -1}
+        if code == 124:
+            return {"output": f"{out}{err}\nTimeout after {self.timeout}s", "returncode": -1}
+        return {"output": out + err, "returncode": code}
 
-    def read_file(self, path: str) -> str:
-        r = self.execute(f"cat '{path}'")
+    async def read_file(self, path: str) -> str:
+        r = await self.execute(f"cat '{path}'")
         return r["output"] if r["returncode"] == 0 else f"Error: {r['output']}"
 
-    def write_file(self, path: str, content: str) -> str:
-        r = self.execute(f"cat > '{path}' << 'NANOEOF'\n{content}\nNANOEOF")
-        return "OK" if r["returncode"] == 0 else f"Error: {r['output']}"
-
-    def grep(self, pattern: str, path: str = ".") -> str:
-        r = self.execute(f"grep -rn '{pattern}' '{path}' 2>/dev/null | head -100")
+    async def write_file(self, path: str, content: str) -> str:
+        # docker cp streams the file through the daemon instead of a shell heredoc
+        dest = path if path.startswith("/") else f"{self.workdir}/{path}"
+        with tempfile.NamedTemporaryFile("w", delete=False) as tf:
+            tf.write(content)
+        try:
+            # docker cp applies the host file's mode; keep the existing file's so the patch has no mode change
+            code, out, _ = await _run(["docker", "exec", self.container_id, "stat", "-c", "%a", dest],
+                                      timeout=self.timeout)
+            os.chmod(tf.name, int(out, 8) if code == 0 else 0o644)
+            code, out, err = await _run(["docker", "cp", tf.name, f"{self.container_id}:{dest}"], timeout=self.timeout)
+        except asyncio.TimeoutError:
+            return f"Error: Timeout after {self.timeout}s"
+        finally:
+            os.unlink(tf.name)
+        return "OK" if code == 0 else f"Error: {out + err}"
+
+    async def grep(self, pattern: str, path: str = ".") -> str:
+        r = await self.execute(f"grep -rn '{pattern}' '{path}' 2>/dev/null | head -100")
         return r["output"] or "No matches"
 
-    def find(self, pattern: str) -> str:
-        r = self.execute(f"find . -name '{pattern}' 2>/dev/null | head -50")
+    async def find(self, pattern: str) -> str:
+        r = await self.execute(f"find . -name '{pattern}' 2>/dev/null | head -50")
         return r["output"] or "No files found"
 
-    def list_dir(self, path: str = ".") -> str:
-        return self.execute(f"ls -la '{path}'")["output"]
+    async def list_dir(self, path: str = ".") -> str:
+        return (await self.execute(f"ls -la '{path}'"))["output"]
 
-    def get_patch(self) -> str:
-        return self.execute("git diff")["output"]
+    async def get_patch(self) -> str:
+        return (await self.execute("git diff"))["output"]
 
-    def stop(self):
+    async def stop(self):
         if self.container_id:
-            subprocess.run(["docker", "stop", self.container_id], capture_output=True)
+            try:
+                await _run(["docker", "stop", self.container_id], timeout=60)
+            except asyncio.TimeoutError:
+                pass
 
 # ============================================================================
 # AGENT
 # ============================================================================
 
+READ_ONLY_TOOLS = {"read_file", "grep", "find", "list_dir"}
+
+TRUNCATED = "\n...[truncated]..."
+
+def _compact(messages: list, max_tool_chars: int = 50_000, keep_last_tools: int = 5, old_tool_chars: int = 2000) -> list:
+    """Shrink tool results so the prompt doesn't grow quadratically over turns.
+
+    The last keep_last_tools results stay (up to max_tool_chars); older ones keep
+    only their first old_tool_chars characters.
+    """
+    tool_idx = [i for i, m in enumerate(messages) if m["role"] == "tool"]
+    recent = set(tool_idx[-keep_last_tools:]) if keep_last_tools else set()
+    for i in tool_idx:
+        limit = max_tool_chars if i in recent else old_tool_chars
+        content = messages[i]["content"]
+        if len(content) > limit + len(TRUNCATED):
+            messages[i] = {**messages[i], "content": content[:limit] + TRUNCATED}
+    return messages
+
 class Agent:
     def __init__(self, env: DockerEnv, system_prompt: str, model: str = "anthropic/claude-sonnet-4-20250514"):
         self.env = env
@@ -148,40 +204,82 @@ class Agent:
         self.cost = 0.0
         self.submitted = False
         self.patch = ""
-
-    def execute_tool(self, name: str, args: dict) -> str:
+        self._file_cache: dict[str, str] = {}  # container path -> content, dropped on bash
+
+    def _key(self, path: str) -> str:
+        return posixpath.normpath(posixpath.join(self.env.workdir, path))
+
+    async def _read(self, path: str) -> str:
+        key = self._key(path)
+        if key in self._file_cache:
+            return self._file_cache[key]
+        content = await self.env.read_file(path)
+        if not content.startswith("Error: "):
+            self._file_cache[key] = content
+        return content
+
+    async def _write(self, path: str, content: str) -> str:
+        result = await self.env.write_file(path, content)
+        if result == "OK":
+            self._file_cache[self._key(path)] = content
+        else:
+            self._file_cache.pop(self._key(path), None)
+        return result
+
+    async def execute_tool(self, name: str, args: dict) -> str:
         self.tool_calls += 1
-        if name == "read_file": return self.env.read_file(args["path"])
-        if name == "write_file": return self.env.write_file(args["path"], args["content"])
+        if name == "read_file":
+            content = await self._read(args["path"])
+            if len(content) > 8000:
+                return content[:8000] + f"\n...[truncated {len(content) - 8000} chars; use bash with sed -n to view more]"
+            return content
+        if name == "write_file": return await self._write(args["path"], args["content"])
         if name == "edit_file":
-            content = self.env.read_file(args["path"])
-            if args["old_string"] not in content: return f"Error: old_string not found"
-            new = content.replace(args["old_string"], args["new_string"], 1)
-            return self.env.write_file(args["path"], new)
+            content = await self._read(args["path"])
+            old = args["old_string"]
+            idx = content.find(old)
+            if idx < 0: return f"Error: old_string not found"
+            if content.find(old, idx + 1) >= 0: return "Error: old_string is not unique; include more context"
+            new = content[:idx] + args["new_string"] + content[idx + len(old):]
+            return await self._write(args["path"], new)
         if name == "bash":
-            r = self.env.execute(args["command"])
+            self._file_cache.clear()  # commands can touch any file
+            r = await self.env.execute(args["command"])
             return f"Exit: {r['returncode']}\n{r['output'][:8000]}"
-        if name == "grep": return self.env.grep(args["pattern"], args.get("path", "."))
-        if name == "find": return self.env.find(args["pattern"])
-        if name == "list_dir": return self.env.list_dir(args.get("path", "."))
+        if name == "grep": return await self.env.grep(args["pattern"], args.get("path", "."))
+        if name == "find": return await self.env.find(args["pattern"])
+        if name == "list_dir": return await self.env.list_dir(args.get("path", "."))
         if name == "submit":
             self.submitted = True
-            self.patch = self.env.get_patch()
+            self.patch = await self.env.get_patch()
             return f"Submitted: {args['summary']}"
         return f"Unknown tool: {name}"
 
-    def run(self, problem: str, max_turns: int = 40) -> tuple[str, str]:
+    async def execute_tools(self, calls: list[tuple[str, dict]]) -> list[str]:
+        """Run one turn's tool calls in order; consecutive read-only calls run concurrently."""
+        results, batch = [], []
+        for name, args in calls:
+            if name in READ_ONLY_TOOLS:
+                batch.append(self.execute_tool(name, args))
+                continue
+            # Writes, bash and submit may depend on earlier calls, so they act as barriers
+            results += await asyncio.gather(*batch)
+            batch = []
+            results.append(await self.execute_tool(name, args))
+        results += await asyncio.gather(*batch)
+        return results
+
+    async def run(self, problem: str, max_turns: int = 40) -> tuple[str, str]:
         self.messages = [
             {"role": "system", "content": self.system_prompt},
             {"role": "user", "content": f"<problem>\n{problem}\n</problem>\n\nFix this issue. Code is in /testbed."}
         ]
 
-        tools = [{"type": "function", "function": {"name": t["name"], "description": t["description"], "parameters": t["input_schema"]}} for t in TOOLS]
-
         for turn in range(max_turns):
+            self.messages = _compact(self.messages)
             try:
-                response = litellm.completion(
-                    model=self.model, messages=self.messages, tools=tools, tool_choice="auto",
+                response = await litellm.acompletion(
+                    model=self.model, messages=self.messages, tools=OPENAI_TOOLS, tool_choice="auto",
                     max_tokens=4096, api_key=os.environ.get("ANTHROPIC_API_KEY"),
                     base_url=os.environ.get("ANTHROPIC_BASE_URL")
                 )
@@ -202,81 +300,170 @@ class Agent:
             })
 
             if tool_calls:
-                for tc in tool_calls:
-                    args = json.loads(tc.function.arguments) if tc.function.arguments else {}
-                    result = self.execute_tool(tc.function.name, args)
+                calls = [(tc.function.name, json_loads(tc.function.arguments) if tc.function.arguments else {}) for tc in tool_calls]
+                for tc, result in zip(tool_calls, await self.execute_tools(calls)):
                     self.messages.append({"role": "tool", "tool_call_id": tc.id, "content": result})
 
             if self.submitted:
                 return "Submitted", self.patch
             if response.choices[0].finish_reason == "stop" and not tool_calls:
-                self.patch = self.env.get_patch()
+                self.patch = await self.env.get_patch()
                 return "EndTurn", self.patch
 
-        self.patch = self.env.get_patch()
+        self.patch = await self.env.get_patch()
         return "MaxTurns", self.patch
 
 # ============================================================================
 # COMPARISON RUNNER
 # ============================================================================
 
-def get_docker_image(instance: dict) -> str:
-    iid = instance["instance_id"].replace("__", "_1776_")
+@functools.lru_cache(maxsize=None)
+def _image_for(instance_id: str) -> str:
+    iid = instance_id.replace("__", "_1776_")
     return f"docker.io/swebench/sweb.eval.x86_64.{iid}:latest".lower()
 
-def run_comparison(instances: list, output_dir: Path, versions: list[str] = None):
+def get_docker_image(instance: dict) -> str:
+    return _image_for(instance["instance_id"])
+
+def image_present(image: str) -> bool:
+    return subprocess.run(["docker", "image", "inspect", image], capture_output=True).returncode == 0
+
+def save_preds(path: Path, preds: dict, compress: bool = False):
+    """Write plain JSON for the harness, plus a zstd copy at <path>.zst if compress"""
+    path.write_bytes(json_dumps(preds, indent=True))
+    if compress:
+        zst = path.with_name(path.name + ".zst")
+        zst.write_bytes(zstandard.ZstdCompressor(level=3).compress(json_dumps(preds)))
+
+def start_pull(image: str) -> Optional[subprocess.Popen]:
+    if image_present(image):
+        return None
+    return subprocess.Popen(["docker", "pull", image], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def wait_pull(proc: Optional[subprocess.Popen], timeout: int = 600):
+    if proc is None:
+        return
+    try:
+        proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+class EnvPool:
+    """Containers for one instance, shared by agent versions and reset between uses."""
+
+    def __init__(self, image: str, size: int):
+        self.image = image
+        self.sem = asyncio.Semaphore(size)
+        self.idle: list[DockerEnv] = []
+        self.envs: list[DockerEnv] = []
+
+    async def acquire(self) -> DockerEnv:
+        await self.sem.acquire()
+        if self.idle:
+            return self.idle.pop()
+        env = DockerEnv()
+        try:
+            await env.start(self.image)
+        except Exception:
+            self.sem.release()
+            raise
+        self.envs.append(env)
+        return env
+
+    async def release(self, env: DockerEnv):
+        # Keep ignored files (-x would drop in-place built extensions in SWE-bench images)
+        r = await env.execute("git reset --hard HEAD && git clean -fd")
+        if r["returncode"] == 0:
+            self.idle.append(env)
+        else:
+            self.envs.remove(env)
+            await env.stop()
+        self.sem.release()
+
+    async def close(self):
+        await asyncio.gather(*(env.stop() for env in self.envs))
+
+async def run_version(version: str, inst: dict, pool: EnvPool) -> dict:
+    """Run one agent version on an instance using a pooled container."""
+    cfg = AGENT_VERSIONS[version]
+    iid = inst["instance_id"]
+    try:
+        env = await pool.acquire()
+    except Exception as e:
+        print(f"\n  >> {cfg['name']} ({version})")
+        print(f"     Error: {e}")
+        return {"instance_id": iid, "model_patch": "", "exit_status": f"Error: {e}"}
+    try:
+        agent = Agent(env, cfg["system"])
+        status, patch = await agent.run(inst["problem_statement"])
+        print(f"\n  >> {cfg['name']} ({version})")
+        print(f"     Status: {status}, Tools: {agent.tool_calls}, Cost: ${agent.cost:.2f}")
+        print(f"     Patch: {len(patch)} chars")
+        return {
+            "instance_id": iid,
+            "model_patch": patch,
+            "exit_status": status,
+            "tool_calls": agent.tool_calls,
+            "cost": agent.cost,
+        }
+    except Exception as e:
+        print(f"\n  >> {cfg['name']} ({version})")
+        print(f"     Error: {e}")
+        return {"instance_id": iid, "model_patch": "", "exit_status": f"Error: {e}"}
+    finally:
+        await pool.release(env)
+
+async def run_comparison(instances: list, output_dir: Path, versions: list[str] = None, concurrency: int = None,
+                         compress: bool = False):
     """Run multiple agent versions on same instances."""
     if versions is None:
         versions = list(AGENT_VERSIONS.keys())
 
     output_dir.mkdir(parents=True, exist_ok=True)
-    results = {v: {} for v in versions}
-
-    for i, inst in enumerate(instances):
+    # Finished runs are appended to preds_<version>.jsonl as they complete, so an
+    # interrupted comparison resumes where it stopped
+    results = {v: load_jsonl(output_dir / f"preds_{v}.jsonl") for v in versions}
+    pending = [inst for inst in instances if any(inst["instance_id"] not in results[v] for v in versions)]
+    if len(pending) < len(instances):
+        print(f"Resuming: {len(instances) - len(pending)} instances already done")
+    # Versions mostly wait on the API, so run them together; each concurrent
+    # slot gets one container that is reset and reused by later versions
+    concurrency = max(1, min(concurrency or len(versions), len(versions)))
+    # Pull the next instance's image while the current one runs
+    pull = start_pull(get_docker_image(pending[0])) if pending else None
+
+    for i, inst in enumerate(pending):
         iid = inst["instance_id"]
         image = get_docker_image(inst)
+        todo = [v for v in versions if iid not in results[v]]
 
         print(f"\n{'='*60}")
-        print(f"[{i+1}/{len(instances)}] {iid}")
+        print(f"[{i+1}/{len(pending)}] {iid}")
         print(f"{'='*60}")
 
-        # Pull image once
         print("  Pulling image...")
-        subprocess.run(["docker", "pull", image], capture_output=True, timeout=600)
-
-        for version in versions:
-            cfg = AGENT_VERSIONS[version]
-            print(f"\n  >> {cfg['name']} ({version})")
-
-            env = DockerEnv()
-            try:
-                env.start(image)
-                agent = Agent(env, cfg["system"])
-                status, patch = agent.run(inst["problem_statement"])
-
-                results[version][iid] = {
-                    "instance_id": iid,
-                    "model_patch": patch,
-                    "exit_status": status,
-                    "tool_calls": agent.tool_calls,
-                    "cost": agent.cost,
-                }
-                print(f"     Status: {status}, Tools: {agent.tool_calls}, Cost: ${agent.cost:.2f}")
-                print(f"     Patch: {len(patch)} chars")
+        await asyncio.to_thread(wait_pull, pull)
+        pull = start_pull(get_docker_image(pending[i + 1])) if i + 1 < len(pending) else None
 
-            except Exception as e:
-                print(f"     Error: {e}")
-                results[version][iid] = {"instance_id": iid, "model_patch": "", "exit_status": f"Error: {e}"}
-            finally:
-                env.stop()
+        pool = EnvPool(image, concurrency)
+        try:
+            outcomes = await asyncio.gather(*(run_version(v, inst, pool) for v in todo))
+        finally:
+            await pool.close()
+        for version, outcome in zip(todo, outcomes):
+            results[version][iid] = outcome
+            if not outcome["exit_status"].startswith("Error"):  # errors are retried on resume
+                with open(output_dir / f"preds_{version}.jsonl", "ab") as f:
+                    f.write(json_dumps(outcome) + b"\n")
 
     # Save results
     for version in versions:
         preds_file = output_dir / f"preds_{version}.json"
         preds = {iid: {"instance_id": iid, "model_name_or_path": f"nano-{version}", "model_patch": r["model_patch"]}
                  for iid, r in results[version].items()}
-        preds_file.write_text(json.dumps(preds, indent=2))
-        print(f"\nSaved: {preds_file}")
+        save_preds(preds_file, preds, compress)
+        print(f"\nSaved: {preds_file}" + (" (+ .zst)" if compress else ""))
 
     # Summary
     print(f"\n{'='*60}")
@@ -296,13 +483,17 @@ def main():
     parser.add_argument("--instances", type=int, default=5, help="Number of instances")
     parser.add_argument("--versions", nargs="+", default=None, help="Agent versions to test")
     parser.add_argument("-o", "--output", default="./comparison_results", help="Output dir")
+    parser.add_argument("-j", "--concurrency", type=int, default=None, help="Containers per instance (default: one per version)")
+    parser.add_argument("--compress", action="store_true", help="Also write zstd-compressed preds_<version>.json.zst")
     args = parser.parse_args()
+    if args.compress and zstandard is None:
+        parser.error("--compress requires the zstandard package")
 
     print("Loading SWE-bench Lite dev split...")
-    instances = list(load_dataset("princeton-nlp/SWE-bench_Lite", split="dev"))[:args.instances]
+    instances = load_instances(args.instances)
     print(f"Testing {len(instances)} instances")
 
-    results = run_comparison(instances, Path(args.output), args.versions)
+    results = asyncio.run(run_comparison(instances, Path(args.output), args.versions, args.concurrency, args.compress))
 
     print("\n\nTo evaluate with official harness:")
     for v in (args.versions or list(AGENT_VERSIONS.keys())):
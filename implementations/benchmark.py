@@ -3,7 +3,7 @@
 nano-opencode API Benchmark Tool
 
 Measures API performance metrics:
-- Latency (time to first byte, total response time)
+- Latency (time to first streamed token, total response time)
 - Throughput (tokens per second)
 - Error rate
 - Cost estimation
@@ -12,13 +12,19 @@ Usage:
     python benchmark.py                    # Quick benchmark (5 iterations)
     python benchmark.py --full             # Full benchmark (20 iterations)
     python benchmark.py --endpoint z.ai    # Test specific endpoint
+    python benchmark.py --workers 1        # Sequential requests
+    python benchmark.py --batch-rows 3     # Send 3 prompts per request
+    python benchmark.py --rpm 50           # Stay under 50 requests/minute
 """
 
-import os, sys, json, time, statistics
-from urllib.request import Request, urlopen
-from urllib.error import URLError, HTTPError
+import os, re, sys, time, statistics, threading
+import http.client
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
+
+from _jsonutil import json_dumps, json_loads
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # CONFIGURATION
@@ -51,17 +57,83 @@ TEST_PROMPTS = [
     {"name": "analysis", "prompt": "Analyze the pros and cons of microservices vs monolithic architecture in 5 bullet points each.", "expected_tokens": 300},
 ]
 
+# Latency grows with rows per request, so keep batches small
+MAX_BATCH_ROWS = 8
+
+# A 429 is retried after Retry-After seconds (or this default) up to this many times
+RATE_LIMIT_RETRIES = 3
+DEFAULT_RETRY_AFTER = 5.0
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # BENCHMARK FUNCTIONS
 # ═══════════════════════════════════════════════════════════════════════════════
 
-def call_api(endpoint: str, prompt: str, model: str, api_key: str) -> Dict[str, Any]:
+class TokenBucket:
+    """Request pacer shared by all workers: spaces requests 60/rpm seconds apart
+    (rpm=None disables pacing) and holds everyone back after a 429"""
+
+    def __init__(self, rpm: Optional[float] = None):
+        self.interval = 60.0 / rpm if rpm else 0.0
+        self.last = 0.0    # when the last request was let through
+        self.resume = 0.0  # no request before this, set by a 429
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        # Reserve a slot under the lock, sleep outside it
+        with self.lock:
+            now = time.perf_counter()
+            self.last = max(self.last + self.interval, self.resume, now)
+            wait = self.last - now
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        with self.lock:
+            self.resume = max(self.resume, time.perf_counter() + seconds)
+
+def _retry_after(res: http.client.HTTPResponse) -> float:
+    try:
+        return max(0.0, float(res.getheader("Retry-After", "")))
+    except ValueError:  # missing, or an HTTP date
+        return DEFAULT_RETRY_AFTER
+
+_local = threading.local()
+
+def _get_conn(endpoint: str) -> Tuple[http.client.HTTPConnection, str]:
+    """Return a keep-alive connection for this thread, reused across requests"""
+    url = urlsplit(endpoint)
+    conns = _local.__dict__.setdefault("conns", {})
+    conn = conns.get(url.netloc)
+    if conn is None:
+        cls = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        conn = conns[url.netloc] = cls(url.netloc, timeout=120)
+    return conn, url.path + (f"?{url.query}" if url.query else "")
+
+def _drop_conn(endpoint: str):
+    conn = _local.__dict__.get("conns", {}).pop(urlsplit(endpoint).netloc, None)
+    if conn:
+        conn.close()
+
+def _post(endpoint: str, data: bytes, headers: Dict[str, str]) -> http.client.HTTPResponse:
+    for attempt in range(2):
+        conn, path = _get_conn(endpoint)
+        try:
+            conn.request("POST", path, body=data, headers=headers)
+            return conn.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            # Server closed the idle keep-alive connection; retry once on a fresh one
+            _drop_conn(endpoint)
+            if attempt:
+                raise
+
+def call_api(endpoint: str, prompt: str, model: str, api_key: str, limiter: Optional[TokenBucket] = None) -> Dict[str, Any]:
     """Make API call and measure timing"""
-    data = json.dumps({
+    data = json_dumps({
         "model": model,
         "max_tokens": 1024,
+        "stream": True,
         "messages": [{"role": "user", "content": prompt}]
-    }).encode()
+    })
 
     headers = {
         "Content-Type": "application/json",
@@ -69,40 +141,111 @@ def call_api(endpoint: str, prompt: str, model: str, api_key: str) -> Dict[str,
         "anthropic-version": "2023-06-01"
     }
 
+    limiter = limiter or TokenBucket()
     start_time = time.perf_counter()
     first_byte_time = None
 
     try:
-        req = Request(endpoint, data=data, headers=headers)
-        with urlopen(req, timeout=120) as res:
-            first_byte_time = time.perf_counter()
-            response_data = res.read()
-            end_time = time.perf_counter()
-
-        result = json.loads(response_data)
-
-        # Extract token counts
-        usage = result.get("usage", {})
-        input_tokens = usage.get("input_tokens", 0)
-        output_tokens = usage.get("output_tokens", 0)
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            limiter.acquire()
+            start_time = time.perf_counter()  # time spent rate limited doesn't count
+            res = _post(endpoint, data, headers)
+            if res.status != 429 or attempt == RATE_LIMIT_RETRIES:
+                break
+            res.read()
+            limiter.pause(_retry_after(res))
+
+        if res.status >= 400:
+            res.read()
+            return {"success": False, "error": f"HTTP {res.status}: {res.reason}", "total_time": (time.perf_counter() - start_time) * 1000}
+
+        # Consume the SSE stream; TTFB is stamped when the first token arrives
+        response_length = 0
+        input_tokens = output_tokens = 0
+        text = []
+        error = None
+        for line in res:
+            response_length += len(line)
+            if not line.startswith(b"data:"):
+                continue
+            event = json_loads(line[5:])
+            etype = event.get("type")
+            if etype == "content_block_delta":
+                if first_byte_time is None:
+                    first_byte_time = time.perf_counter()
+                text.append(event.get("delta", {}).get("text", ""))
+            elif etype == "message_start":
+                input_tokens = event["message"].get("usage", {}).get("input_tokens", 0)
+            elif etype == "message_delta":
+                output_tokens = event.get("usage", {}).get("output_tokens", output_tokens)
+            elif etype == "error":
+                error = event.get("error", {}).get("message", "stream error")
+        end_time = time.perf_counter()
+
+        if error:
+            return {"success": False, "error": f"Stream Error: {error}", "total_time": (end_time - start_time) * 1000}
 
         return {
             "success": True,
-            "ttfb": (first_byte_time - start_time) * 1000,  # Time to first byte (ms)
-            "total_time": (end_time - start_time) * 1000,   # Total time (ms)
+            "ttfb": ((first_byte_time or end_time) - start_time) * 1000,  # Time to first token (ms)
+            "total_time": (end_time - start_time) * 1000,                 # Time to last byte (ms)
             "input_tokens": input_tokens,
             "output_tokens": output_tokens,
-            "response_length": len(response_data),
+            "response_length": response_length,
+            "text": "".join(text),
         }
 
-    except HTTPError as e:
-        return {"success": False, "error": f"HTTP {e.code}: {e.reason}", "total_time": (time.perf_counter() - start_time) * 1000}
-    except URLError as e:
-        return {"success": False, "error": f"URL Error: {e.reason}", "total_time": (time.perf_counter() - start_time) * 1000}
+    except OSError as e:
+        _drop_conn(endpoint)
+        return {"success": False, "error": f"Connection Error: {e}", "total_time": (time.perf_counter() - start_time) * 1000}
     except Exception as e:
+        _drop_conn(endpoint)
         return {"success": False, "error": str(e), "total_time": (time.perf_counter() - start_time) * 1000}
 
-def run_benchmark(endpoint_name: str, iterations: int = 5, verbose: bool = True) -> Dict[str, Any]:
+def _stats(values: List[float]) -> Tuple[float, float, float]:
+    """Mean, median and p95 from a single sort"""
+    s = sorted(values)
+    n = len(s)
+    median = s[n // 2] if n % 2 else (s[n // 2 - 1] + s[n // 2]) / 2
+    p95 = s[int(n * 0.95)] if n > 1 else s[0]
+    return statistics.fmean(s), median, p95
+
+def call_api_batched(endpoint: str, prompts: List[str], model: str, api_key: str, limiter: Optional[TokenBucket] = None) -> List[Dict[str, Any]]:
+    """Send several prompts as one request and split the answer per prompt.
+
+    Latency can't be split, so every row reports the request's ttfb/total_time;
+    tokens are apportioned by each answer's share of the response text.
+    """
+    if len(prompts) == 1:
+        return [call_api(endpoint, prompts[0], model, api_key, limiter)]
+
+    rows = "\n".join(f"[{n}] {p}" for n, p in enumerate(prompts, 1))
+    result = call_api(endpoint, f"Answer each of the following. Prefix each answer with its [N] marker.\n{rows}", model, api_key, limiter)
+    if not result["success"]:
+        return [dict(result) for _ in prompts]
+
+    parts = re.split(r"^\s*\[(\d+)\]", result["text"], flags=re.M)
+    answers = {int(n): a.strip() for n, a in zip(parts[1::2], parts[2::2])}
+    total_len = sum(len(answers.get(n, "")) for n in range(1, len(prompts) + 1)) or 1
+
+    rows = []
+    for n in range(1, len(prompts) + 1):
+        if n not in answers:
+            rows.append({"success": False, "error": f"Missing answer [{n}] in batched response", "total_time": result["total_time"]})
+            continue
+        share = len(answers[n]) / total_len
+        rows.append({
+            "success": True,
+            "ttfb": result["ttfb"],
+            "total_time": result["total_time"],
+            "input_tokens": round(result["input_tokens"] / len(prompts)),
+            "output_tokens": round(result["output_tokens"] * share),
+            "response_length": len(answers[n]),
+            "text": answers[n],
+        })
+    return rows
+
+def run_benchmark(endpoint_name: str, iterations: int = 5, verbose: bool = True, workers: int = 8, batch_rows: int = 1, rpm: Optional[float] = None) -> Dict[str, Any]:
     """Run full benchmark suite for an endpoint"""
     endpoint_config = ENDPOINTS.get(endpoint_name)
     if not endpoint_config:
@@ -112,12 +255,15 @@ def run_benchmark(endpoint_name: str, iterations: int = 5, verbose: bool = True)
     if not api_key:
         return {"error": f"API key not set: {endpoint_config['key_env']}"}
 
+    batch_rows = max(1, min(batch_rows, MAX_BATCH_ROWS))
     results = {
         "endpoint": endpoint_name,
         "url": endpoint_config["url"],
         "model": endpoint_config["model"],
         "timestamp": datetime.now().isoformat(),
         "iterations": iterations,
+        "batch_rows": batch_rows,
+        "rpm": rpm,
         "tests": {}
     }
 
@@ -132,68 +278,78 @@ def run_benchmark(endpoint_name: str, iterations: int = 5, verbose: bool = True)
         print(f"  URL: {endpoint_config['url']}")
         print(f"  Model: {endpoint_config['model']}")
         print(f"  Iterations: {iterations}")
+        print(f"  Workers: {workers}")
+        if batch_rows > 1:
+            print(f"  Batch rows: {batch_rows}")
+        if rpm:
+            print(f"  Rate limit: {rpm:g} requests/min")
         print(f"{'='*70}\n")
 
+    # Group up to batch_rows prompts of the same iteration into one request
+    groups = [[(test, i) for test in TEST_PROMPTS[j:j + batch_rows]]
+              for i in range(iterations) for j in range(0, len(TEST_PROMPTS), batch_rows)]
+
+    # Submit every request first, then collect, so requests actually overlap
+    per_test = {test["name"]: [] for test in TEST_PROMPTS}
+    limiter = TokenBucket(rpm)
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(groups)))) as executor:
+        futures = {
+            executor.submit(call_api_batched, endpoint_config["url"], [test["prompt"] for test, _ in group],
+                            endpoint_config["model"], api_key, limiter): [(test["name"], i) for test, i in group]
+            for group in groups
+        }
+        for fut in as_completed(futures):
+            for (name, i), result in zip(futures[fut], fut.result()):
+                per_test[name].append(result)
+
+                if result["success"]:
+                    all_ttfb.append(result["ttfb"])
+                    all_total.append(result["total_time"])
+                    if result["output_tokens"] > 0:
+                        tps = result["output_tokens"] / (result["total_time"] / 1000)
+                        all_tokens_per_sec.append(tps)
+                    if verbose:
+                        print(f"  {name:<14} [{i+1}/{iterations}] TTFB: {result['ttfb']:.0f}ms, Total: {result['total_time']:.0f}ms, Tokens: {result['output_tokens']}")
+                else:
+                    errors += 1
+                    if verbose:
+                        print(f"  {name:<14} [{i+1}/{iterations}] ERROR: {result['error']}")
+
+    # Aggregate test results
     for test in TEST_PROMPTS:
-        test_results = []
-
-        if verbose:
-            print(f"Testing: {test['name']}")
-
-        for i in range(iterations):
-            result = call_api(
-                endpoint_config["url"],
-                test["prompt"],
-                endpoint_config["model"],
-                api_key
-            )
-            test_results.append(result)
-
-            if result["success"]:
-                all_ttfb.append(result["ttfb"])
-                all_total.append(result["total_time"])
-                if result["output_tokens"] > 0:
-                    tps = result["output_tokens"] / (result["total_time"] / 1000)
-                    all_tokens_per_sec.append(tps)
-                if verbose:
-                    print(f"  [{i+1}/{iterations}] TTFB: {result['ttfb']:.0f}ms, Total: {result['total_time']:.0f}ms, Tokens: {result['output_tokens']}")
-            else:
-                errors += 1
-                if verbose:
-                    print(f"  [{i+1}/{iterations}] ERROR: {result['error']}")
-
-            # Small delay between requests
-            time.sleep(0.5)
-
-        # Aggregate test results
+        test_results = per_test[test["name"]]
         successful = [r for r in test_results if r["success"]]
         if successful:
+            ttfb_avg, ttfb_p50, ttfb_p95 = _stats([r["ttfb"] for r in successful])
+            total_avg, total_p50, _ = _stats([r["total_time"] for r in successful])
             results["tests"][test["name"]] = {
                 "success_rate": len(successful) / len(test_results) * 100,
-                "ttfb_avg": statistics.mean([r["ttfb"] for r in successful]),
-                "ttfb_p50": statistics.median([r["ttfb"] for r in successful]),
-                "ttfb_p95": sorted([r["ttfb"] for r in successful])[int(len(successful) * 0.95)] if len(successful) > 1 else successful[0]["ttfb"],
-                "total_time_avg": statistics.mean([r["total_time"] for r in successful]),
-                "total_time_p50": statistics.median([r["total_time"] for r in successful]),
-                "output_tokens_avg": statistics.mean([r["output_tokens"] for r in successful]),
+                "ttfb_avg": ttfb_avg,
+                "ttfb_p50": ttfb_p50,
+                "ttfb_p95": ttfb_p95,
+                "total_time_avg": total_avg,
+                "total_time_p50": total_p50,
+                "output_tokens_avg": statistics.fmean([r["output_tokens"] for r in successful]),
             }
 
-        if verbose:
-            print()
+    if verbose:
+        print()
 
     # Overall summary
     if all_total:
+        ttfb_avg, ttfb_p50, ttfb_p95 = _stats(all_ttfb)
+        total_avg, total_p50, total_p95 = _stats(all_total)
         results["summary"] = {
             "total_requests": len(TEST_PROMPTS) * iterations,
             "successful_requests": len(all_total),
             "error_rate": errors / (len(TEST_PROMPTS) * iterations) * 100,
-            "ttfb_avg_ms": statistics.mean(all_ttfb),
-            "ttfb_p50_ms": statistics.median(all_ttfb),
-            "ttfb_p95_ms": sorted(all_ttfb)[int(len(all_ttfb) * 0.95)] if len(all_ttfb) > 1 else all_ttfb[0],
-            "total_time_avg_ms": statistics.mean(all_total),
-            "total_time_p50_ms": statistics.median(all_total),
-            "total_time_p95_ms": sorted(all_total)[int(len(all_total) * 0.95)] if len(all_total) > 1 else all_total[0],
-            "tokens_per_second_avg": statistics.mean(all_tokens_per_sec) if all_tokens_per_sec else 0,
+            "ttfb_avg_ms": ttfb_avg,
+            "ttfb_p50_ms": ttfb_p50,
+            "ttfb_p95_ms": ttfb_p95,
+            "total_time_avg_ms": total_avg,
+            "total_time_p50_ms": total_p50,
+            "total_time_p95_ms": total_p95,
+            "tokens_per_second_avg": statistics.fmean(all_tokens_per_sec) if all_tokens_per_sec else 0,
         }
 
     return results
@@ -221,7 +377,7 @@ def print_results(results: Dict[str, Any]):
 ║  Total Requests:     {s['total_requests']:<55} ║
 ║  Success Rate:       {100 - s['error_rate']:.1f}%{' ':<52} ║
 ║                                                                               ║
-║  LATENCY (Time to First Byte)                                                 ║
+║  LATENCY (Time to First Token)                                                ║
 ║  ─────────────────────────────────────────────────────────────────────────    ║
 ║  Average:            {s['ttfb_avg_ms']:>8.0f} ms{' ':<47} ║
 ║  Median (P50):       {s['ttfb_p50_ms']:>8.0f} ms{' ':<47} ║
@@ -247,13 +403,13 @@ def print_results(results: Dict[str, Any]):
 
     print("""╚═══════════════════════════════════════════════════════════════════════════════╝""")
 
-def compare_endpoints(iterations: int = 5):
+def compare_endpoints(iterations: int = 5, workers: int = 8, batch_rows: int = 1, rpm: Optional[float] = None):
     """Compare all configured endpoints"""
     all_results = {}
 
     for endpoint_name in ENDPOINTS:
         print(f"\nBenchmarking {endpoint_name}...")
-        results = run_benchmark(endpoint_name, iterations=iterations, verbose=True)
+        results = run_benchmark(endpoint_name, iterations=iterations, verbose=True, workers=workers, batch_rows=batch_rows, rpm=rpm)
         all_results[endpoint_name] = results
         print_results(results)
 
@@ -287,27 +443,30 @@ def main():
     parser.add_argument("--iterations", "-n", type=int, default=5, help="Number of iterations per test")
     parser.add_argument("--compare", "-c", action="store_true", help="Compare all endpoints")
     parser.add_argument("--output", "-o", help="Save results to JSON file")
+    parser.add_argument("--workers", "-w", type=int, default=8, help="Concurrent requests")
+    parser.add_argument("--batch-rows", "-b", type=int, default=1, help=f"Prompts per request (max {MAX_BATCH_ROWS})")
+    parser.add_argument("--rpm", type=float, help="Cap requests per minute (default: only back off on HTTP 429)")
     args = parser.parse_args()
 
     iterations = 20 if args.full else args.iterations
 
     if args.compare:
-        compare_endpoints(iterations)
+        compare_endpoints(iterations, args.workers, args.batch_rows, args.rpm)
     elif args.endpoint:
-        results = run_benchmark(args.endpoint, iterations=iterations)
+        results = run_benchmark(args.endpoint, iterations=iterations, workers=args.workers, batch_rows=args.batch_rows, rpm=args.rpm)
         print_results(results)
         if args.output:
-            with open(args.output, "w") as f:
-                json.dump(results, f, indent=2)
+            with open(args.output, "wb") as f:
+                f.write(json_dumps(results, indent=True))
             print(f"\nResults saved to {args.output}")
     else:
         # Default: test z.ai endpoint
         endpoint = "z.ai" if os.environ.get("ANTHROPIC_BASE_URL", "").find("z.ai") >= 0 else "anthropic"
-        results = run_benchmark(endpoint, iterations=iterations)
+        results = run_benchmark(endpoint, iterations=iterations, workers=args.workers, batch_rows=args.batch_rows, rpm=args.rpm)
         print_results(results)
         if args.output:
-            with open(args.output, "w") as f:
-                json.dump(results, f, indent=2)
+            with open(args.output, "wb") as f:
+                f.write(json_dumps(results, indent=True))
 
 if __name__ == "__main__":
     main()
@@ -5,25 +5,37 @@ Tests all nano-opencode language implementations on SWE-bench.
 All versions use the SAME prompt for fair comparison.
 """
 
+import asyncio
+import atexit
+import base64
+import functools
+import hashlib
+import io
 import json
-import os
+import posixpath
+import queue
+import shlex
 import subprocess
+import tarfile
+import threading
 import time
+from collections import OrderedDict
 from datetime import datetime
 from pathlib import Path
 
+import docker
 import litellm
-from datasets import load_dataset
+
+from _env import load_api_config
+from _jsonutil import json_dumps, json_loads
+from _swebench import load_instances
 
 litellm.set_verbose = False
 
-# Load API config
-config_path = Path.home() / ".config" / "mini-swe-agent" / ".env"
-if config_path.exists():
-    for line in config_path.read_text().splitlines():
-        if '=' in line and not line.startswith('#'):
-            k, v = line.split('=', 1)
-            os.environ[k.strip()] = v.strip()
+load_api_config()
+
+# One API client per process, used for file uploads over pooled connections
+_DOCKER = docker.APIClient(base_url="unix:///var/run/docker.sock", num_pools=32)
 
 # =============================================================================
 # UNIVERSAL PROMPT (same for ALL language versions)
@@ -36,6 +48,7 @@ Available tools:
 - write_file(path, content): Write to file
 - edit_file(path, old, new): Replace text in file
 - bash(command): Run shell command
+- batch_bash(commands): Run several independent shell commands in one call
 - glob(pattern): Find files matching pattern
 - grep(pattern, path): Search for pattern in files
 - list_dir(path): List directory contents
@@ -140,6 +153,27 @@ TOOLS = [
             "required": ["command"],
         },
     },
+    {
+        "name": "batch_bash",
+        "description": "Run several independent bash commands in one call; outputs are returned in order",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "commands": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "description": {"type": "string", "description": "What the command is for"},
+                            "command": {"type": "string", "description": "Command to run"},
+                        },
+                        "required": ["command"],
+                    },
+                },
+            },
+            "required": ["commands"],
+        },
+    },
     {
         "name": "glob",
         "description": "Find files matching a glob pattern",
@@ -178,54 +212,206 @@ TOOLS = [
 ]
 
 
+class Shell:
+    """Long-lived `docker exec -i <container> bash`; each command's output is
+    framed by a numbered sentinel line carrying its exit code."""
+
+    def __init__(self, container: str):
+        self.proc = subprocess.Popen(["docker", "exec", "-i", container, "bash"],
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        self.lock = threading.Lock()
+        self.n = 0
+
+    def run(self, cmd: str, timeout: int) -> tuple:
+        """Run cmd, returning (exit_code, combined output bytes)."""
+        with self.lock:
+            self.n += 1
+            end = f"__END_{self.n}__ ".encode()
+            self.proc.stdin.write(f"{{ {cmd}\n}} 2>&1 </dev/null; printf '\\n{end.decode()}%d\\n' $?\n".encode())
+            self.proc.stdin.flush()
+            # A hung command kills the shell; the EOF below reports the timeout
+            watchdog = threading.Timer(timeout, self.proc.kill)
+            watchdog.start()
+            try:
+                out = []
+                for line in iter(self.proc.stdout.readline, b""):
+                    if line.startswith(end):
+                        out[-1] = out[-1][:-1]  # newline printed before the sentinel
+                        return int(line[len(end):]), b"".join(out)
+                    out.append(line)
+            finally:
+                watchdog.cancel()
+            raise TimeoutError
+
+    def close(self):
+        self.proc.kill()
+        self.proc.wait()
+
+
+_SHELLS: dict = {}
+_SHELLS_LOCK = threading.Lock()
+
+
+def shell_exec(container: str, cmd: str, timeout: int = 30, raw: bool = False) -> tuple:
+    """Run cmd in the container's persistent shell, returning (exit_code, output);
+    output is left as bytes if raw."""
+    with _SHELLS_LOCK:
+        shell = _SHELLS.get(container)
+        if shell is None or shell.proc.poll() is not None:
+            shell = _SHELLS[container] = Shell(container)
+    try:
+        code, out = shell.run(cmd, timeout)
+    except (TimeoutError, OSError):
+        close_shell(container)  # the next call starts a fresh shell
+        raise
+    return code, out if raw else out.decode(errors="replace")
+
+
+def close_shell(container: str):
+    with _SHELLS_LOCK:
+        shell = _SHELLS.pop(container, None)
+    if shell:
+        shell.close()
+
+
+@atexit.register
+def _close_shells():
+    for container in list(_SHELLS):
+        close_shell(container)
+
+
+def put_file(container: str, path: str, content: str):
+    """Write content to path in the container as a one-file tar stream."""
+    path = posixpath.join("/testbed", path)
+    data = content.encode()
+    # put_archive applies the entry's mode; keep an existing file's so the patch has no mode change
+    code, out = shell_exec(container, f"stat -c %a {shlex.quote(path)} 2>/dev/null")
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        info = tarfile.TarInfo(posixpath.basename(path))
+        info.size, info.mode, info.mtime = len(data), int(out, 8) if code == 0 else 0o644, int(time.time())
+        tar.addfile(info, io.BytesIO(data))
+    buf.seek(0)  # stream the buffer itself rather than a getvalue() copy
+    _DOCKER.put_archive(container, posixpath.dirname(path), buf)
+
+
+# Read/exec tools that reduce to a shell command; adjacent ones share one exec
+SHELL_TOOLS = {"read_file", "list_dir", "glob", "grep", "bash"}
+READ_TOOLS = SHELL_TOOLS - {"bash"}
+TOOL_SEP = b"\0TOOLSEP\0"
+# Tool output is cut on bytes before decoding; the model sees far less anyway
+MAX_TOOL_OUTPUT_BYTES = 20_000
+
+
+class ToolCache:
+    """LRU of read-only tool output. Anything that may write bumps the
+    container's generation, which retires all of its cached entries."""
+
+    def __init__(self, maxsize: int = 512):
+        self.entries = OrderedDict()
+        self.gens = {}
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+
+    def key(self, container: str, name: str, args: dict) -> tuple:
+        digest = hashlib.sha256(json.dumps(args, sort_keys=True).encode()).hexdigest()
+        return container, self.gens.get(container, 0), name, digest
+
+    def get(self, key: tuple):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+
+    def put(self, key: tuple, value: str):
+        with self.lock:
+            self.entries[key] = value
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, container: str):
+        with self.lock:
+            self.gens[container] = self.gens.get(container, 0) + 1
+
+
+TOOL_CACHE = ToolCache()
+
+
+def shell_command(name: str, args: dict) -> tuple:
+    """Shell form of a read/exec tool and its timeout in seconds."""
+    if name == "read_file":
+        return f"cat -- {shlex.quote(args['path'])}", 30
+    if name == "list_dir":
+        return f"ls -la -- {shlex.quote(args['path'])}", 30
+    if name == "glob":
+        return f"find /testbed -name {shlex.quote(args['pattern'])} 2>/dev/null | head -50", 30
+    if name == "grep":
+        path = args.get("path", "/testbed")
+        return f"grep -r -- {shlex.quote(args['pattern'])} {shlex.quote(path)} 2>/dev/null | head -50", 30
+    return args["command"], 120
+
+
+def shell_result(name: str, code: int, out: str) -> str:
+    if code == 124:
+        return "Error: Command timed out"
+    if name in ("read_file", "list_dir"):
+        return out if code == 0 else f"Error: {out}"
+    if name == "glob":
+        return out or "No files found"
+    if name == "grep":
+        return out or "No matches found"
+    return out[:10000]
+
+
+def run_shell_tools(calls: list, container: str) -> list:
+    """Run (name, args) shell tools in a single exec and split the output per call."""
+    try:
+        script, total = [], 0
+        for name, args in calls:
+            cmd, timeout = shell_command(name, args)
+            total += timeout
+            # Each command gets its own bash so exit/cd can't leak into the next
+            script.append(f"timeout -k 5 {timeout} bash -c {shlex.quote(cmd)} 2>&1 </dev/null; printf '\\0%d\\0TOOLSEP\\0' $?")
+        _, out = shell_exec(container, "\n".join(script), timeout=total + 10, raw=True)
+    except TimeoutError:
+        return ["Error: Command timed out"] * len(calls)
+    except Exception as e:
+        return [f"Error: {str(e)}"] * len(calls)
+
+    parts = out.split(TOOL_SEP)
+    results = []
+    for (name, _), part in zip(calls, parts[:len(calls)]):
+        body, _, code = part.rpartition(b"\0")
+        results.append(shell_result(name, int(code), body[:MAX_TOOL_OUTPUT_BYTES].decode(errors="replace")))
+    return results + ["Error: Command did not complete"] * (len(calls) - len(results))
+
+
+# edit_file runs in the container, so the file never crosses dockerd; old and
+# new text arrive base64-encoded to sidestep quoting. Exit 3 means not found.
+EDIT_SCRIPT = (
+    "import sys, base64, pathlib\n"
+    "p = pathlib.Path(sys.argv[1]); old, new = (base64.b64decode(a) for a in sys.argv[2:])\n"
+    "t = p.read_bytes()\n"
+    "sys.exit(3) if old not in t else p.write_bytes(t.replace(old, new))\n"
+)
+
+
 def execute_tool(name: str, args: dict, container: str) -> str:
     """Execute a tool in the Docker container."""
+    if name in SHELL_TOOLS:
+        return batch_execute([(name, args)], container)[0]
+    TOOL_CACHE.invalidate(container)
     try:
-        if name == "read_file":
-            cmd = f"docker exec {container} cat '{args['path']}'"
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=30)
-            return result.stdout if result.returncode == 0 else f"Error: {result.stderr}"
-
-        elif name == "write_file":
-            content = args["content"].replace("'", "'\\''")
-            cmd = f"docker exec {container} bash -c \"cat > '{args['path']}' << 'EOFWRITE'\n{content}\nEOFWRITE\""
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=30)
-            return "File written successfully" if result.returncode == 0 else f"Error: {result.stderr}"
+        if name == "write_file":
+            put_file(container, args["path"], args["content"])
+            return "File written successfully"
 
         elif name == "edit_file":
-            # Read, replace, write
-            read_cmd = f"docker exec {container} cat '{args['path']}'"
-            result = subprocess.run(read_cmd, shell=True, capture_output=True, text=True, timeout=30)
-            if result.returncode != 0:
-                return f"Error reading file: {result.stderr}"
-
-            content = result.stdout.replace(args["old_text"], args["new_text"])
-            content_escaped = content.replace("'", "'\\''")
-            write_cmd = f"docker exec {container} bash -c \"cat > '{args['path']}' << 'EOFWRITE'\n{content_escaped}\nEOFWRITE\""
-            result = subprocess.run(write_cmd, shell=True, capture_output=True, text=True, timeout=30)
-            return "File edited successfully" if result.returncode == 0 else f"Error: {result.stderr}"
-
-        elif name == "bash":
-            cmd = f"docker exec {container} bash -c '{args['command']}'"
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=120)
-            output = result.stdout + result.stderr
-            return output[:10000] if len(output) > 10000 else output
-
-        elif name == "glob":
-            cmd = f"docker exec {container} find /testbed -name '{args['pattern']}' 2>/dev/null | head -50"
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=30)
-            return result.stdout or "No files found"
-
-        elif name == "grep":
-            path = args.get("path", "/testbed")
-            cmd = f"docker exec {container} grep -r '{args['pattern']}' {path} 2>/dev/null | head -50"
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=30)
-            return result.stdout or "No matches found"
-
-        elif name == "list_dir":
-            cmd = f"docker exec {container} ls -la '{args['path']}'"
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=30)
-            return result.stdout if result.returncode == 0 else f"Error: {result.stderr}"
+            b64 = [base64.b64encode(args[k].encode()).decode() for k in ("old_text", "new_text")]
+            code, out = shell_exec(container, shlex.join(["python3", "-c", EDIT_SCRIPT, args["path"], *b64]))
+            if code == 3:
+                return "Error: old_text not found"
+            return "File edited successfully" if code == 0 else f"Error: {(out.strip().splitlines() or [''])[-1]}"
 
         elif name == "submit":
             return "SUBMIT"
@@ -233,12 +419,64 @@ def execute_tool(name: str, args: dict, container: str) -> str:
         else:
             return f"Unknown tool: {name}"
 
-    except subprocess.TimeoutExpired:
+    except TimeoutError:
         return "Error: Command timed out"
     except Exception as e:
         return f"Error: {str(e)}"
 
 
+def batch_execute(calls: list, container: str) -> list:
+    """Execute one turn's (name, args) tool calls in order.
+
+    Adjacent shell tools, including every command of a batch_bash, run in a
+    single exec, and repeated reads are answered from TOOL_CACHE. Stops after
+    submit, so the result list may be shorter than calls.
+    """
+    results, pending = [], []  # pending: (result index, batch_bash command or None, name, args, cache key)
+
+    def flush():
+        outs = run_shell_tools([(name, args) for _, _, name, args, _ in pending], container) if pending else []
+        for (i, command, _, _, key), out in zip(pending, outs):
+            results[i] = out if command is None else f"{results[i]}$ {command}\n{out}\n"
+            if key and not out.startswith("Error"):
+                TOOL_CACHE.put(key, out)
+        pending.clear()
+
+    for name, args in calls:
+        if name in READ_TOOLS:
+            # The key carries the current generation, so a read queued before
+            # a write in the same batch is stored under the old one
+            key = TOOL_CACHE.key(container, name, args)
+            hit = TOOL_CACHE.get(key)
+            results.append("" if hit is None else hit)
+            if hit is None:
+                pending.append((len(results) - 1, None, name, args, key))
+        elif name == "bash":
+            TOOL_CACHE.invalidate(container)
+            results.append("")
+            pending.append((len(results) - 1, None, name, args, None))
+        elif name == "batch_bash":
+            TOOL_CACHE.invalidate(container)
+            results.append("")
+            for c in args.get("commands", []):
+                pending.append((len(results) - 1, c["command"], "bash", {"command": c["command"]}, None))
+        else:
+            flush()
+            results.append(execute_tool(name, args, container))
+            if results[-1] == "SUBMIT":
+                break
+    flush()
+    return results
+
+
+# Tool outputs older than this many turns are replaced by a stub, so the
+# history resent every turn stops growing with every file the agent read
+KEEP_TOOL_TURNS = 3
+
+# Tools that can change the working tree, and so the patch
+MUTATING_TOOLS = {"write_file", "edit_file", "bash", "batch_bash"}
+
+
 class UniversalAgent:
     """Agent that works the same way regardless of language implementation."""
 
@@ -248,8 +486,33 @@ class UniversalAgent:
         self.tool_calls = 0
         self.cost = 0.0
         self.status = "Running"
-
-    def run(self, instance: dict, container: str, max_turns: int = 40) -> str:
+        # Containers start from a clean checkout, so a run that never
+        # mutates anything has an empty patch without asking git
+        self._dirty = False
+        self._last_diff = ""
+
+    def elide_old_results(self):
+        """Stub out tool results from before the last KEEP_TOOL_TURNS turns."""
+        turns = 0
+        for m in reversed(self.messages):
+            if m["role"] == "assistant":
+                turns += 1
+            elif m["role"] == "tool" and turns >= KEEP_TOOL_TURNS:
+                if m["content"].startswith("<elided"):
+                    break  # everything before this was stubbed on an earlier turn
+                m["content"] = f"<elided {len(m['content'])} chars>"
+
+    def diff(self, container: str) -> str:
+        """The patch so far; git diff only reruns after a mutating tool."""
+        if self._dirty:
+            # The shell merges stderr into the output, so drop it here and check the exit code:
+            # a warning or a failed git diff must never end up as the patch
+            code, out = shell_exec(container, "git diff --no-color --no-ext-diff 2>/dev/null", timeout=60)
+            self._last_diff = out if code == 0 else ""
+            self._dirty = False
+        return self._last_diff
+
+    async def run(self, instance: dict, container: str, max_turns: int = 40) -> str:
         """Run the agent on an instance."""
         problem = instance["problem_statement"]
 
@@ -259,7 +522,7 @@ class UniversalAgent:
 
         for turn in range(max_turns):
             try:
-                response = litellm.completion(
+                response = await litellm.acompletion(
                     model="anthropic/claude-sonnet-4-20250514",
                     messages=self.messages,
                     tools=TOOLS,
@@ -278,26 +541,20 @@ class UniversalAgent:
                     break
 
                 # Execute tools
-                tool_results = []
-                for tc in msg.tool_calls:
-                    self.tool_calls += 1
-                    args = json.loads(tc.function.arguments) if tc.function.arguments else {}
-                    result = execute_tool(tc.function.name, args, container)
-
-                    if result == "SUBMIT":
-                        self.status = "Submitted"
-                        # Get the patch
-                        diff_cmd = f"docker exec {container} git diff"
-                        diff_result = subprocess.run(diff_cmd, shell=True, capture_output=True, text=True)
-                        return diff_result.stdout
-
-                    tool_results.append({
-                        "role": "tool",
-                        "tool_call_id": tc.id,
-                        "content": result[:5000],
-                    })
-
-                self.messages.extend(tool_results)
+                calls = [(tc.function.name, json_loads(tc.function.arguments) if tc.function.arguments else {})
+                         for tc in msg.tool_calls]
+                results = await asyncio.to_thread(batch_execute, calls, container)
+                self.tool_calls += len(results)
+                self._dirty |= any(name in MUTATING_TOOLS for name, _ in calls)
+
+                if results[-1] == "SUBMIT":
+                    self.status = "Submitted"
+                    # Get the patch
+                    return await asyncio.to_thread(self.diff, container)
+
+                self.messages.extend({"role": "tool", "tool_call_id": tc.id, "content": result[:5000]}
+                                     for tc, result in zip(msg.tool_calls, results))
+                self.elide_old_results()
 
             except Exception as e:
                 self.status = f"Error: {str(e)}"
@@ -307,40 +564,105 @@ class UniversalAgent:
             self.status = "MaxTurns"
 
         # Get final diff even if not submitted
-        diff_cmd = f"docker exec {container} git diff"
-        diff_result = subprocess.run(diff_cmd, shell=True, capture_output=True, text=True)
-        return diff_result.stdout
+        return await asyncio.to_thread(self.diff, container)
+
+
+@functools.lru_cache(maxsize=None)
+def image_for(instance_id: str) -> str:
+    return f"swebench/sweb.eval.x86_64.{instance_id.replace('/', '_').replace('__', '_')}:latest"
+
 
+_CONTAINER_STATE: dict = {}  # name -> last known State.Status, "" if missing
 
-def get_container_for_instance(instance_id: str) -> str:
-    """Get or start Docker container for instance."""
-    container_name = f"swe-bench-{instance_id.replace('/', '-').replace('__', '-')}"
 
-    # Check if container exists
-    check = subprocess.run(f"docker ps -a --filter name={container_name} --format '{{{{.Names}}}}'",
-                          shell=True, capture_output=True, text=True)
+def container_state(name: str) -> str:
+    """Container status from one targeted inspect, remembered for the process."""
+    if name not in _CONTAINER_STATE:
+        r = subprocess.run(["docker", "container", "inspect", "--format", "{{.State.Status}}", name],
+                           capture_output=True, text=True)
+        _CONTAINER_STATE[name] = r.stdout.strip() if r.returncode == 0 else ""
+    return _CONTAINER_STATE[name]
 
-    if container_name in check.stdout:
-        # Start if stopped
-        subprocess.run(f"docker start {container_name}", shell=True, capture_output=True)
-        return container_name
 
-    # Create new container from SWE-bench image
-    image = f"swebench/sweb.eval.x86_64.{instance_id.replace('/', '_').replace('__', '_')}:latest"
-    subprocess.run(f"docker run -d --name {container_name} {image} tail -f /dev/null",
-                  shell=True, capture_output=True)
-    time.sleep(2)
+def get_container_for_instance(instance_id: str, lang: str) -> str:
+    """Get or start the Docker container for one language's run on an instance."""
+    container_name = f"swe-bench-{instance_id.replace('/', '-').replace('__', '-')}-{lang}"
+
+    state = container_state(container_name)
+    if state == "paused":
+        subprocess.run(["docker", "unpause", container_name], capture_output=True)
+    elif state and state != "running":
+        subprocess.run(["docker", "start", container_name], capture_output=True)
+    elif not state:
+        # Create new container from SWE-bench image
+        subprocess.run(["docker", "run", "-d", "--name", container_name, image_for(instance_id), "tail", "-f", "/dev/null"],
+                       capture_output=True)
+        time.sleep(2)
+    _CONTAINER_STATE[container_name] = "running"
     return container_name
 
 
-def run_benchmark(num_instances: int = 5, languages: list = None):
+class ContainerPool:
+    """Starts the containers for upcoming instances on a background thread,
+    staying up to `size` instances ahead of the benchmark."""
+
+    def __init__(self, instances: list, languages: list, size: int = 4):
+        self.ready = queue.Queue(maxsize=size)
+        self.created = []
+        threading.Thread(target=self._fill, args=(instances, languages), daemon=True).start()
+        atexit.register(self.close)
+
+    def _fill(self, instances: list, languages: list):
+        for instance in instances:
+            try:
+                containers = {}
+                for lang in languages:
+                    containers[lang] = get_container_for_instance(instance["instance_id"], lang)
+                    self.created.append(containers[lang])
+                self.ready.put(containers)
+            except Exception as e:
+                self.ready.put(e)
+
+    def get(self) -> dict:
+        """Containers by language for the next instance, in instance order."""
+        containers = self.ready.get()
+        if isinstance(containers, Exception):
+            raise containers
+        return containers
+
+    def release(self, containers: list):
+        """Remove a finished instance's containers now; each is used exactly once."""
+        subprocess.run(["docker", "rm", "-f", *containers], capture_output=True)
+        for name in containers:
+            self.created.remove(name)
+            _CONTAINER_STATE[name] = ""
+
+    def close(self):
+        if self.created:
+            subprocess.run(["docker", "rm", "-f", *self.created], capture_output=True)
+            for name in self.created:
+                _CONTAINER_STATE[name] = ""
+            self.created = []
+
+
+async def run_language(lang: str, instance: dict, container: str) -> tuple:
+    """Run one language's agent on the instance in its own container."""
+    try:
+        start_time = time.time()
+        agent = UniversalAgent(lang)
+        patch = await agent.run(instance, container)
+        return agent, patch, time.time() - start_time
+    finally:
+        close_shell(container)
+
+
+async def run_benchmark(num_instances: int = 5, languages: list = None):
     """Run benchmark on specified languages."""
     if languages is None:
         languages = [k for k, v in LANGUAGES.items() if v["available"]]
 
     print(f"Loading SWE-bench Lite...")
-    dataset = load_dataset("princeton-nlp/SWE-bench_Lite", split="dev")
-    instances = list(dataset)[:num_instances]
+    instances = load_instances(num_instances)
 
     print(f"Testing {len(instances)} instances with languages: {languages}")
     print(f"Using UNIVERSAL prompt for all languages (fair comparison)")
@@ -350,6 +672,8 @@ def run_benchmark(num_instances: int = 5, languages: list = None):
     predictions = {lang: {} for lang in languages}
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    # Next instances' containers start while the current one runs
+    pool = ContainerPool(instances, languages)
 
     for i, instance in enumerate(instances):
         iid = instance["instance_id"]
@@ -357,45 +681,45 @@ def run_benchmark(num_instances: int = 5, languages: list = None):
         print("=" * 60)
 
         try:
-            container = get_container_for_instance(iid)
+            containers = await asyncio.to_thread(pool.get)
         except Exception as e:
             print(f"  Error setting up container: {e}")
             continue
 
-        for lang in languages:
+        # Agents wait on the API most of the time, so run every language at
+        # once; each gets its own container so edits can't collide
+        outcomes = await asyncio.gather(*(run_language(lang, instance, containers[lang]) for lang in languages),
+                                        return_exceptions=True)
+        # Remove the instance's containers in one call so finished ones don't hold memory
+        await asyncio.to_thread(pool.release, list(containers.values()))
+        for lang, outcome in zip(languages, outcomes):
             print(f"\n  >> {LANGUAGES[lang]['name']}")
 
-            start_time = time.time()
-            agent = UniversalAgent(lang)
+            if isinstance(outcome, Exception):
+                print(f"     Error: {outcome}")
+                results[lang]["total"] += 1
+                continue
 
-            try:
-                patch = agent.run(instance, container)
-                elapsed = time.time() - start_time
+            agent, patch, elapsed = outcome
+            has_patch = len(patch.strip()) > 0
+            results[lang]["total"] += 1
+            results[lang]["cost"] += agent.cost
+            results[lang]["tools"] += agent.tool_calls
+            results[lang]["times"].append(elapsed)
 
-                has_patch = len(patch.strip()) > 0
-                results[lang]["total"] += 1
-                results[lang]["cost"] += agent.cost
-                results[lang]["tools"] += agent.tool_calls
-                results[lang]["times"].append(elapsed)
-
-                if has_patch:
-                    results[lang]["patches"] += 1
-                    predictions[lang][iid] = {
-                        "instance_id": iid,
-                        "model_name_or_path": f"nano-{lang}",
-                        "model_patch": patch[:10000],
-                    }
-
-                status_icon = "[Y]" if has_patch else "[N]"
-                print(f"     {status_icon} Status: {agent.status}, Tools: {agent.tool_calls}, "
-                      f"Cost: ${agent.cost:.2f}, Patch: {len(patch)} chars, Time: {elapsed:.1f}s")
+            if has_patch:
+                results[lang]["patches"] += 1
+                predictions[lang][iid] = {
+                    "instance_id": iid,
+                    "model_name_or_path": f"nano-{lang}",
+                    "model_patch": patch[:10000],
+                }
 
-            except Exception as e:
-                print(f"     Error: {e}")
-                results[lang]["total"] += 1
+            status_icon = "[Y]" if has_patch else "[N]"
+            print(f"     {status_icon} Status: {agent.status}, Tools: {agent.tool_calls}, "
+                  f"Cost: ${agent.cost:.2f}, Patch: {len(patch)} chars, Time: {elapsed:.1f}s")
 
-        # Cleanup container
-        subprocess.run(f"docker stop {container}", shell=True, capture_output=True)
+    pool.close()
 
     # Print summary
     print(f"\n{'=' * 60}")
@@ -416,8 +740,7 @@ def run_benchmark(num_instances: int = 5, languages: list = None):
 
     for lang in languages:
         pred_file = output_dir / f"preds_{lang}.json"
-        with open(pred_file, "w") as f:
-            json.dump(predictions[lang], f, indent=2)
+        pred_file.write_bytes(json_dumps(predictions[lang], indent=True))
 
     # Save summary
     summary = {
@@ -427,8 +750,7 @@ def run_benchmark(num_instances: int = 5, languages: list = None):
         "prompt": UNIVERSAL_PROMPT,
         "results": results,
     }
-    with open(output_dir / "summary.json", "w") as f:
-        json.dump(summary, f, indent=2)
+    (output_dir / "summary.json").write_bytes(json_dumps(summary, indent=True))
 
     print(f"\nResults saved to: {output_dir}")
     return results
@@ -441,4 +763,4 @@ if __name__ == "__main__":
     parser.add_argument("-l", "--languages", nargs="+", default=None, help="Languages to test")
     args = parser.parse_args()
 
-    run_benchmark(args.num, args.languages)
+    asyncio.run(run_benchmark(args.num, args.languages))
@@ -51,6 +51,9 @@ TEST_PROMPTS = [
     "create a file called test.txt with the content 'hello world'",
 ]
 
+# Every implementation prints this before running a tool
+TOOL_MARK = "⚡".encode()
+
 @dataclass
 class Result:
     language: str
@@ -99,7 +102,6 @@ def run_test(lang: str, impl: dict, prompt: str, base_dir: Path, timeout: int =
             cmd,
             cwd=base_dir,
             capture_output=True,
-            text=True,
             timeout=timeout,
             env={**os.environ}
         )
@@ -107,8 +109,8 @@ def run_test(lang: str, impl: dict, prompt: str, base_dir: Path, timeout: int =
         total_time = time.time() - start
         output = result.stdout + result.stderr
 
-        # Count tool calls (⚡ markers)
-        tool_calls = output.count("⚡")
+        # Count tool calls (⚡ markers) on the raw bytes; only the kept head is decoded
+        tool_calls = output.count(TOOL_MARK)
 
         return Result(
             language=lang,
@@ -117,7 +119,7 @@ def run_test(lang: str, impl: dict, prompt: str, base_dir: Path, timeout: int =
             startup_time=0,  # Would need more instrumentation
             total_time=total_time,
             tool_calls=tool_calls,
-            output=output[:500],
+            output=output[:2000].decode(errors="replace")[:500],
         )
     except subprocess.TimeoutExpired:
         return Result(
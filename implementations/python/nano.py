@@ -7,8 +7,11 @@ Usage: ANTHROPIC_API_KEY=sk-... python nano.py "read package.json"
 """
 
 import os, sys, json, subprocess
+from http.client import HTTPConnection, HTTPSConnection, RemoteDisconnected
 from pathlib import Path
-from urllib.request import Request, urlopen
+from urllib.parse import urlsplit
+try: from orjson import dumps, loads  # optional; faster encode/decode of the growing history
+except ImportError: from json import loads; dumps = lambda o: json.dumps(o).encode()
 
 API_KEY = os.environ.get("ANTHROPIC_API_KEY") or os.environ.get("ANTHROPIC_AUTH_TOKEN", "")
 MODEL = os.environ.get("MODEL", "claude-sonnet-4-20250514")
@@ -23,18 +26,28 @@ TOOLS = [
     {"name": "list_dir", "description": "List directory", "input_schema": {"type": "object", "properties": {"path": {"type": "string"}}, "required": ["path"]}},
 ]
 
+_FILE_CACHE = {}  # abs path -> (mtime_ns, size, text); unchanged files are served from memory
+
+def read(path: str) -> str:
+    key = os.path.abspath(path); st = os.stat(key); ent = _FILE_CACHE.get(key)
+    if ent and ent[:2] == (st.st_mtime_ns, st.st_size): return ent[2]
+    text = Path(key).read_text(); _FILE_CACHE[key] = (st.st_mtime_ns, st.st_size, text); return text
+
 def run(name: str, i: dict) -> str:
     try:
         if name == "read_file":
-            return Path(i["path"]).read_text() if Path(i["path"]).exists() else "File not found"
+            try: return read(i["path"])
+            except FileNotFoundError: return "File not found"
+        if name in ("write_file", "edit_file"):
+            _FILE_CACHE.pop(os.path.abspath(i["path"]), None)
         if name == "write_file":
             Path(i["path"]).write_text(i["content"]); return "OK"
         if name == "edit_file":
-            p = Path(i["path"]); c = p.read_text()
+            p = Path(i["path"]); c = read(i["path"])
             if i["old_string"] not in c: return "old_string not found"
             p.write_text(c.replace(i["old_string"], i["new_string"], 1)); return "OK"
         if name == "bash":
-            return subprocess.run(i["command"], shell=True, capture_output=True, text=True, timeout=30).stdout[:50000]
+            return subprocess.run(i["command"], shell=True, capture_output=True, timeout=30).stdout[:50000].decode(errors="replace")
         if name == "list_dir":
             p = Path(i.get("path", "."))
             return "\n".join(f"{'d' if x.is_dir() else '-'} {x.name}" for x in p.iterdir())
@@ -42,11 +55,24 @@ def run(name: str, i: dict) -> str:
     except Exception as e:
         return f"Error: {e}"
 
+# Only the messages change between turns, so the rest of the request body is encoded once
+_BODY_HEAD = dumps({"model": MODEL, "max_tokens": 8192, "tools": TOOLS, "system": "You are a coding assistant. Use tools to help."})[:-1] + b', "messages": '
+_conn = None  # one keep-alive connection for the session, so each turn skips the TCP/TLS handshake
+
 def call(messages: list) -> dict:
-    data = json.dumps({"model": MODEL, "max_tokens": 8192, "tools": TOOLS, "messages": messages, "system": "You are a coding assistant. Use tools to help."}).encode()
-    req = Request(API_URL, data=data, headers={"Content-Type": "application/json", "x-api-key": API_KEY, "anthropic-version": "2023-06-01"})
-    with urlopen(req) as res:
-        return json.loads(res.read())
+    global _conn
+    data = _BODY_HEAD + dumps(messages) + b"}"
+    url = urlsplit(API_URL)
+    for attempt in range(2):
+        _conn = _conn or (HTTPSConnection if url.scheme == "https" else HTTPConnection)(url.netloc)
+        try:
+            _conn.request("POST", url.path, body=data, headers={"Content-Type": "application/json", "x-api-key": API_KEY, "anthropic-version": "2023-06-01"})
+            res = _conn.getresponse(); body = res.read(); break
+        except (RemoteDisconnected, ConnectionResetError, BrokenPipeError):  # server dropped the idle connection
+            _conn.close(); _conn = None
+            if attempt: raise
+    if res.status >= 400: raise RuntimeError(f"HTTP {res.status}: {body.decode(errors='replace')[:500]}")
+    return loads(body)
 
 def agent(prompt: str) -> str:
     messages = [{"role": "user", "content": prompt}]
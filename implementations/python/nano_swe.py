@@ -13,9 +13,12 @@ Features:
 Usage: ANTHROPIC_API_KEY=sk-... python nano_swe.py "fix the bug in issue #123"
 """
 
-import os, sys, json, subprocess, re, shutil, tempfile
+import os, sys, json, subprocess, re, shlex, shutil, tempfile, fnmatch, itertools, mmap, select, signal, threading, time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from pathlib import Path
-from urllib.request import Request, urlopen
+from http.client import HTTPConnection, HTTPSConnection, RemoteDisconnected
+from urllib.parse import urlsplit
 from datetime import datetime
 
 API_KEY = os.environ.get("ANTHROPIC_API_KEY") or os.environ.get("ANTHROPIC_AUTH_TOKEN", "")
@@ -135,178 +138,466 @@ TOOLS = [
 # TOOL IMPLEMENTATIONS
 # ═══════════════════════════════════════════════════════════════════════════════
 
+# ripgrep walks in parallel and skips .gitignore'd trees; grep is the fallback
+_RG = shutil.which("rg")
+
+_SKIP_DIRS = frozenset({".git", "node_modules", "__pycache__", ".venv", "dist", "build", ".mypy_cache"})
+
+_GITIGNORE_CACHE = {}  # abs path of a .gitignore -> (mtime_ns, rules)
+
+def _gitignore_rules(root: str) -> tuple:
+    """(pattern, negate, dir_only, anchored) rules from root/.gitignore, parsed once per mtime"""
+    path = os.path.abspath(os.path.join(root, ".gitignore"))
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return ()
+    hit = _GITIGNORE_CACHE.get(path)
+    if hit and hit[0] == mtime: return hit[1]
+    rules = []
+    with open(path, errors="replace") as f:
+        for line in f:
+            line = line.rstrip()
+            if not line or line.startswith('#'): continue
+            negate = line.startswith('!')
+            line = line[negate:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            anchored = '/' in line  # a slash anywhere but the end ties the pattern to root
+            if line.startswith("**/"): line, anchored = line[3:], False
+            rules.append((line.lstrip('/'), negate, dir_only, anchored))
+    _GITIGNORE_CACHE[path] = (mtime, tuple(rules))
+    return tuple(rules)
+
+def _ignored(rel: str, name: str, is_dir: bool, rules: tuple) -> bool:
+    """Whether rel (path relative to the walk root) is gitignored; the last matching rule wins"""
+    ignored = False
+    for pat, negate, dir_only, anchored in rules:
+        if (is_dir or not dir_only) and fnmatch.fnmatchcase(rel if anchored else name, pat):
+            ignored = not negate
+    return ignored
+
+def _walk_files(root: str, pattern: str, match_path: bool = False):
+    """Yield files under root whose name (or whole path) matches pattern, pruning ignored/hidden dirs"""
+    rules, prefix = _gitignore_rules(root), len(os.path.join(root, ""))
+    stack = [root]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with entries:
+            for e in entries:
+                if e.is_dir(follow_symlinks=False):
+                    if e.name not in _SKIP_DIRS and not e.name.startswith('.') and \
+                            not (rules and _ignored(e.path[prefix:], e.name, True, rules)):
+                        stack.append(e.path)
+                elif e.is_file() and fnmatch.fnmatchcase(e.path if match_path else e.name, pattern) and \
+                        not (rules and _ignored(e.path[prefix:], e.name, False, rules)):
+                    yield e.path
+
+# Keyword-led definition patterns, compiled once; group 1 is the defined name (compared to the symbol per hit)
+_DEFN_PATTERNS = {
+    "function": re.compile(rb"\b(?:def|function|fn|func)[ \t]+(\w+)[ \t]*\("),
+    "class": re.compile(rb"\b(?:class|struct|interface|type)[ \t]+(\w+)"),
+    "variable": re.compile(rb"\b(?:let|const|var|val)[ \t]+(\w+)[ \t]*="),
+    "any": re.compile(rb"\b(?:def|class|function|fn|func|struct|interface|type|let|const|var)[ \t]+(\w+)"),
+}
+_DEFN_EXTS = (".py", ".js", ".ts", ".go", ".rs", ".java")
+
+_MAX_SCAN_BYTES = int(os.environ.get("MAX_SCAN_BYTES", str(10 * 1024 * 1024)))
+
+def _mmap_text(path: str, max_size: int = _MAX_SCAN_BYTES):
+    """Read-only mmap of path, or None if it's empty, unreadable, larger than max_size or binary"""
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0 or size > max_size: return None
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if buf.find(b"\0", 0, 8192) >= 0:  # binary, judged by a NUL in the head like grep/rg
+        buf.close()
+        return None
+    return buf
+
+def _scan_definitions(path: str, pat, sym: bytes):
+    """Yield (line number, line) for each definition of sym in path, scanning an mmap of the file in-process"""
+    buf = _mmap_text(path)
+    if buf is None: return
+    with buf:
+        pos, lineno = 0, 1
+        for m in pat.finditer(buf):
+            if m.group(1) != sym: continue
+            lineno += buf[pos:m.start()].count(b"\n")  # count incrementally from the previous hit
+            pos = m.start()
+            bol = buf.rfind(b"\n", 0, pos) + 1
+            eol = buf.find(b"\n", pos)
+            yield lineno, buf[bol:eol if eol >= 0 else len(buf)].decode(errors="replace")
+
+_REGEX_META = frozenset(".^$*+?()[]{}|\\\n")
+
+def _grep_literal(root: str, needle: bytes, include: str, ctx: int, limit: int = 200) -> list:
+    """grep -n -C ctx for a literal needle via mmap + bytes.find, in grep's output format; at most limit lines"""
+    single = os.path.isfile(root)
+    out = []
+    for path in [root] if single else _walk_files(root, include or "*"):
+        buf = _mmap_text(path)
+        if buf is None: continue
+        shown = {}  # line number -> (separator, line); ':' for matches, '-' for context
+        with buf:
+            size, pos, lineno = len(buf), 0, 1
+            i = buf.find(needle)
+            while i >= 0 and len(out) + len(shown) < limit:
+                lineno += buf[pos:i].count(b"\n")
+                pos = i
+                bol = buf.rfind(b"\n", 0, i) + 1
+                eol = buf.find(b"\n", i)
+                if eol < 0: eol = size
+                shown[lineno] = (":", buf[bol:eol])
+                start, n = bol, lineno
+                for _ in range(ctx):  # context before: walk back a line at a time
+                    if start == 0: break
+                    prev = buf.rfind(b"\n", 0, start - 1) + 1
+                    n -= 1
+                    shown.setdefault(n, ("-", buf[prev:start - 1]))
+                    start = prev
+                stop, n = eol, lineno
+                for _ in range(ctx):  # context after
+                    if stop >= size - 1: break
+                    nxt = buf.find(b"\n", stop + 1)
+                    if nxt < 0: nxt = size
+                    n += 1
+                    shown.setdefault(n, ("-", buf[stop + 1:nxt]))
+                    stop = nxt
+                i = buf.find(needle, eol)  # each line is reported once, however many hits it has
+        last = None
+        for n in sorted(shown):
+            if ctx and out and (last is None or n > last + 1): out.append("--")
+            sep, line = shown[n]
+            line = line.decode(errors="replace")
+            out.append(f"{n}{sep}{line}" if single else f"{path}{sep}{n}{sep}{line}")
+            last = n
+        if len(out) >= limit: break
+    return out[:limit]
+
+def _list_recursive(root: str, max_depth: int, limit: int = 200) -> list:
+    """Up to limit entries under root, max_depth levels deep, in list_dir's format; one scandir per directory"""
+    out, stack = [], [(root, 1)]
+    while stack and len(out) < limit:
+        d, depth = stack.pop()
+        try:
+            entries = sorted(os.scandir(d), key=lambda e: e.name)
+        except OSError:
+            continue
+        subdirs = []
+        for e in entries:
+            if e.name.startswith('.') or e.name in _SKIP_DIRS: continue
+            is_dir = e.is_dir(follow_symlinks=False)
+            size = 0 if is_dir else e.stat(follow_symlinks=False).st_size
+            out.append(f"{'d' if is_dir else '-'} {size:8d}  {e.path}")
+            if is_dir and depth < max_depth: subdirs.append((e.path, depth + 1))
+        stack.extend(reversed(subdirs))
+    return out[:limit]
+
 def _truncate(s: str, max_len: int = 50000) -> str:
     """Truncate long output with indicator"""
     return s[:max_len] + f"\n...[truncated {len(s)-max_len} chars]" if len(s) > max_len else s
 
-def _run_cmd(cmd: str, timeout: int = 120, cwd: str = None) -> str:
-    """Run shell command with timeout"""
+class _Shell:
+    """One long-lived bash for every _run_cmd; each command's output ends at a numbered sentinel line"""
+
+    def __init__(self):
+        self.proc = subprocess.Popen(["bash", "--noprofile", "--norc", "-s"], stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE, stderr=subprocess.STDOUT, start_new_session=True)
+        self.n = 0
+
+    def run(self, cmd: str, timeout: int, cwd: str = None) -> bytes:
+        # Subshell per command so cd/exit/variables don't leak into the next one. The command goes
+        # in as quoted data for eval: an unclosed quote or heredoc is then a syntax error inside
+        # eval instead of swallowing the sentinel printf below
+        self.n += 1
+        end = f"\n__END_{self.n}__ ".encode()
+        self.proc.stdin.write(f"( cd {shlex.quote(cwd or os.getcwd())} || exit 1; eval {shlex.quote(cmd)}\n) 2>&1 </dev/null; printf '\\n__END_{self.n}__ %d\\n' $?\n".encode())
+        self.proc.stdin.flush()
+        fd, buf, deadline = self.proc.stdout.fileno(), bytearray(), time.monotonic() + timeout
+        while True:
+            i = buf.find(end)
+            if i >= 0 and buf.find(b"\n", i + len(end)) >= 0:
+                return bytes(buf[:i])
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                raise subprocess.TimeoutExpired(cmd, timeout)
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                raise EOFError("shell exited")
+            buf += chunk
+
+    def kill(self):
+        try: os.killpg(self.proc.pid, signal.SIGKILL)
+        except OSError: pass
+        self.proc.wait()
+
+_SHELL = None
+
+def _run_argv(argv: list, timeout: int, cwd: str = None, max_lines: int = None, stderr: bool = True) -> str:
+    """Run argv without a shell, keeping at most max_lines lines of output (stderr merged in unless stderr=False)"""
+    proc = subprocess.Popen(argv, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT if stderr else subprocess.DEVNULL, cwd=cwd)
+    timed_out = threading.Event()
+    watchdog = threading.Timer(timeout, lambda: (timed_out.set(), proc.kill()))
+    watchdog.start()
     try:
-        r = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=timeout, cwd=cwd)
-        out = r.stdout + r.stderr
+        # Closing the pipe after max_lines SIGPIPEs the tool, like `| head` without the extra process
+        out = b"".join(itertools.islice(proc.stdout, max_lines))
+    finally:
+        watchdog.cancel()
+        proc.stdout.close()
+        if proc.poll() is None: proc.kill()
+        proc.wait()
+    if timed_out.is_set():
+        return f"Error: Command timed out after {timeout}s"
+    return out.decode(errors="replace")
+
+def _run_cmd(cmd, timeout: int = 120, cwd: str = None, max_lines: int = None, stderr: bool = True) -> str:
+    """Run a shell command string, or an argv list directly (no shell), with timeout.
+    stderr=False drops an argv command's stderr; a shell string handles its own redirects."""
+    global _SHELL
+    if isinstance(cmd, list):
+        try:
+            out = _run_argv(cmd, timeout, cwd, max_lines, stderr)
+        except OSError as e:
+            return f"Error: {e}"
+        return _truncate(out) if out else "(no output)"
+    try:
+        _SHELL = _SHELL or _Shell()
+        out = _SHELL.run(cmd, timeout, cwd).decode(errors="replace")
         return _truncate(out) if out else "(no output)"
     except subprocess.TimeoutExpired:
+        _SHELL.kill(); _SHELL = None  # takes the runaway command's process group with it
         return f"Error: Command timed out after {timeout}s"
     except Exception as e:
+        if _SHELL: _SHELL.kill(); _SHELL = None
         return f"Error: {e}"
 
+# abs path -> (mtime_ns, size, content, lines); repeat reads of unchanged files skip disk and split
+_FILE_CACHE: "OrderedDict[str, tuple]" = OrderedDict()
+_CACHE_MAX = 64
+_CACHE_LOCK = threading.Lock()  # multi_edit reads from a thread pool
+
+def _read_cached(p: Path) -> tuple:
+    """(content, lines) of p, reused while its mtime and size are unchanged"""
+    key, st = os.path.abspath(p), p.stat()
+    with _CACHE_LOCK:
+        ent = _FILE_CACHE.get(key)
+        if ent and ent[:2] == (st.st_mtime_ns, st.st_size):
+            _FILE_CACHE.move_to_end(key)
+            return ent[2:]
+    content = p.read_text()
+    with _CACHE_LOCK:
+        _FILE_CACHE[key] = (st.st_mtime_ns, st.st_size, content, content.split('\n'))
+        if len(_FILE_CACHE) > _CACHE_MAX: _FILE_CACHE.popitem(last=False)
+        return _FILE_CACHE[key][2:]
+
+_WINDOW_MAX = 10000  # read_file ranges up to this many lines are streamed rather than cached
+
+def _write_text(p: Path, content: str):
+    with _CACHE_LOCK:
+        _FILE_CACHE.pop(os.path.abspath(p), None)
+    p.write_text(content)
+
+_NUMBERED_LINE = "%4d | %s".__mod__  # (lineno, line) -> numbered line, without a per-line f-string
+
+# === File Operations ===
+def _t_read_file(args: dict) -> str:
+    p = Path(args["path"])
+    if not p.exists(): return f"Error: File not found: {args['path']}"
+    start = max(args.get("line_start", 1) - 1, 0)
+    end = args.get("line_end")
+    numbers = itertools.count(start + 1)
+    if end is not None and 0 <= end - start < _WINDOW_MAX:
+        # Bounded window: stream and stop reading at line_end instead of loading the whole file.
+        # Streamed lines keep their newline, so they're numbered as-is and joined with ''
+        with p.open() as f:
+            numbered = ''.join(map(_NUMBERED_LINE, zip(numbers, itertools.islice(f, start, end))))
+        return _truncate(numbered[:-1] if numbered.endswith('\n') else numbered)
+    _, lines = _read_cached(p)
+    return _truncate('\n'.join(map(_NUMBERED_LINE, zip(numbers, lines[start:end]))))
+
+def _t_write_file(args: dict) -> str:
+    Path(args["path"]).parent.mkdir(parents=True, exist_ok=True)
+    _write_text(Path(args["path"]), args["content"])
+    return f"OK: Wrote {len(args['content'])} chars to {args['path']}"
+
+def _t_edit_file(args: dict) -> str:
+    p = Path(args["path"])
+    if not p.exists(): return f"Error: File not found: {args['path']}"
+    content, _ = _read_cached(p)
+    old = args["old_string"]
+    if not old: return "Error: old_string is empty; give the exact text to replace"
+    # One left-to-right pass: partition up to the match, then the uniqueness probe over the rest
+    before, sep, after = content.partition(old)
+    if not sep:
+        # Show similar lines to help debug
+        lines = [l for l in content.split('\n') if any(w in l for w in old.split()[:3])]
+        hint = f"\nSimilar lines:\n" + "\n".join(lines[:5]) if lines else ""
+        return f"Error: old_string not found in {args['path']}{hint}"
+    if old in after:
+        # Only count on the (rare) error path
+        return f"Error: old_string appears {content.count(old)} times. Add more context to make it unique."
+    _write_text(p, before + args["new_string"] + after)
+    return f"OK: Edited {args['path']}"
+
+def _t_multi_edit(args: dict) -> str:
+    paths = list(dict.fromkeys(edit["path"] for edit in args["edits"]))
+    for path in paths:
+        if not Path(path).exists(): return f"Error: File not found: {path}"
+    # Read each file once (in parallel), validate and apply in memory, then write in parallel
+    with ThreadPoolExecutor(max_workers=min(8, len(paths)) or 1) as ex:
+        backups = dict(zip(paths, ex.map(lambda path: _read_cached(Path(path))[0], paths)))
+        edited = dict(backups)
+        for edit in args["edits"]:
+            if not edit["old_string"]:
+                return f"Error: old_string is empty in edit for {edit['path']}"
+            before, sep, after = edited[edit["path"]].partition(edit["old_string"])
+            if not sep:
+                return f"Error: old_string not found in {edit['path']}"
+            edited[edit["path"]] = before + edit["new_string"] + after
+        try:
+            list(ex.map(lambda path: _write_text(Path(path), edited[path]), paths))
+            return f"OK: Applied {len(args['edits'])} edits"
+        except Exception as e:
+            # Rollback on failure
+            list(ex.map(lambda path: _write_text(Path(path), backups[path]), paths))
+            return f"Error: {e} (rolled back all changes)"
+
+# === Code Search ===
+def _t_grep(args: dict) -> str:
+    path = args.get("path", ".")
+    ctx = args.get("context", 2)
+    include = args.get("include")
+    if args["pattern"] and not _REGEX_META.intersection(args["pattern"]):
+        # Plain literal (the common case): scan in-process instead of spawning rg/grep
+        return '\n'.join(_grep_literal(path, args["pattern"].encode(), include, ctx)) or "(no output)"
+    if _RG:
+        cmd = ["rg", "--line-number", "--no-heading", "--color", "never", f"-C{ctx}"]
+        if include: cmd += ["-g", include]
+    else:
+        cmd = ["grep", "-rn", "-E", f"-B{ctx}", f"-A{ctx}"]
+        if include: cmd.append(f"--include={include}")
+    cmd += ["-e", args["pattern"], "--", path]
+    return _run_cmd(cmd, max_lines=200, stderr=False)  # like the old 2>/dev/null
+
+def _t_find_files(args: dict) -> str:
+    path = args.get("path", ".")
+    files = list(itertools.islice(_walk_files(path, args["pattern"]), 100))
+    if not files:
+        # Try with ** glob
+        files = list(itertools.islice(_walk_files(path, f"*{args['pattern']}", match_path=True), 100))
+    return '\n'.join(files) or "No files found"
+
+def _t_find_definition(args: dict) -> str:
+    sym = args["name"].encode()
+    pat = _DEFN_PATTERNS.get(args.get("type", "any"), _DEFN_PATTERNS["any"])
+    hits = []
+    for path in _walk_files(".", "*"):
+        if not path.endswith(_DEFN_EXTS): continue
+        for lineno, line in _scan_definitions(path, pat, sym):
+            hits.append(f"{path}:{lineno}:{line}")
+            if len(hits) >= 50: return '\n'.join(hits)
+    return '\n'.join(hits) or f"No definition found for '{args['name']}'"
+
+# === Directory Operations ===
+def _t_list_dir(args: dict) -> str:
+    p = Path(args.get("path", "."))
+    if not p.exists(): return f"Error: Directory not found: {p}"
+    if args.get("recursive"):
+        return '\n'.join(_list_recursive(str(p), args.get("max_depth", 3))) or "(empty directory)"
+    items = []
+    for x in sorted(p.iterdir()):
+        if x.name.startswith('.'): continue
+        size = x.stat().st_size if x.is_file() else 0
+        typ = 'd' if x.is_dir() else '-'
+        items.append(f"{typ} {size:8d}  {x.name}")
+    return '\n'.join(items) or "(empty directory)"
+
+def _t_tree(args: dict) -> str:
+    p = args.get("path", ".")
+    depth = args.get("max_depth", 3)
+    include = f"-P '{args['include']}'" if args.get("include") else ""
+    cmd = f"tree -L {depth} {include} --noreport {p} 2>/dev/null || find {p} -maxdepth {depth} -print 2>/dev/null"
+    return _truncate(_run_cmd(cmd))
+
+# === Shell & Testing ===
+def _t_bash(args: dict) -> str:
+    timeout = args.get("timeout", 120)
+    cwd = args.get("cwd")
+    return _run_cmd(args["command"], timeout=timeout, cwd=cwd)
+
+def _t_run_tests(args: dict) -> str:
+    test_path = args.get("test_path", "")
+    pattern = args.get("pattern", "")
+    verbose = "-v" if args.get("verbose") else ""
+
+    # Auto-detect test framework
+    if Path("pytest.ini").exists() or Path("pyproject.toml").exists() or Path("setup.py").exists():
+        pattern_arg = f"-k '{pattern}'" if pattern else ""
+        cmd = f"python -m pytest {test_path} {pattern_arg} {verbose} --tb=short 2>&1"
+    elif Path("package.json").exists():
+        cmd = f"npm test -- {test_path} 2>&1"
+    elif Path("Cargo.toml").exists():
+        cmd = f"cargo test {test_path} 2>&1"
+    elif Path("go.mod").exists():
+        cmd = f"go test ./... {verbose} 2>&1"
+    else:
+        cmd = f"python -m pytest {test_path} {verbose} --tb=short 2>&1"
+
+    return _truncate(_run_cmd(cmd, timeout=300))
+
+# === Git Operations ===
+def _t_git_status(args: dict) -> str:
+    return _run_cmd("git status --short && echo '---' && git diff --stat HEAD 2>/dev/null")
+
+def _t_git_diff(args: dict) -> str:
+    cmd = ["git", "diff"] + (["--staged"] if args.get("staged") else [])
+    if args.get("path"): cmd += ["--", args["path"]]
+    return _run_cmd(cmd)
+
+def _t_git_log(args: dict) -> str:
+    cmd = ["git", "log", "--oneline", "-n", str(args.get("count", 10))]
+    if args.get("path"): cmd += ["--", args["path"]]
+    return _run_cmd(cmd)
+
+# === Context & Planning ===
+def _t_think(args: dict) -> str:
+    return f"[Thought recorded: {args['thought'][:100]}...]"
+
+# Tool name -> handler; one dict lookup per call instead of walking an if-chain
+_TOOLS = {
+    "read_file": _t_read_file,
+    "write_file": _t_write_file,
+    "edit_file": _t_edit_file,
+    "multi_edit": _t_multi_edit,
+    "grep": _t_grep,
+    "find_files": _t_find_files,
+    "find_definition": _t_find_definition,
+    "list_dir": _t_list_dir,
+    "tree": _t_tree,
+    "bash": _t_bash,
+    "run_tests": _t_run_tests,
+    "git_status": _t_git_status,
+    "git_diff": _t_git_diff,
+    "git_log": _t_git_log,
+    "think": _t_think,
+}
+
 def run_tool(name: str, args: dict) -> str:
     """Execute a tool and return result"""
-    try:
-        # === File Operations ===
-        if name == "read_file":
-            p = Path(args["path"])
-            if not p.exists(): return f"Error: File not found: {args['path']}"
-            content = p.read_text()
-            lines = content.split('\n')
-            start = args.get("line_start", 1) - 1
-            end = args.get("line_end", len(lines))
-            selected = lines[start:end]
-            numbered = [f"{i+start+1:4d} | {line}" for i, line in enumerate(selected)]
-            return _truncate('\n'.join(numbered))
-
-        if name == "write_file":
-            Path(args["path"]).parent.mkdir(parents=True, exist_ok=True)
-            Path(args["path"]).write_text(args["content"])
-            return f"OK: Wrote {len(args['content'])} chars to {args['path']}"
-
-        if name == "edit_file":
-            p = Path(args["path"])
-            if not p.exists(): return f"Error: File not found: {args['path']}"
-            content = p.read_text()
-            if args["old_string"] not in content:
-                # Show similar lines to help debug
-                lines = [l for l in content.split('\n') if any(w in l for w in args["old_string"].split()[:3])]
-                hint = f"\nSimilar lines:\n" + "\n".join(lines[:5]) if lines else ""
-                return f"Error: old_string not found in {args['path']}{hint}"
-            if content.count(args["old_string"]) > 1:
-                return f"Error: old_string appears {content.count(args['old_string'])} times. Add more context to make it unique."
-            p.write_text(content.replace(args["old_string"], args["new_string"], 1))
-            return f"OK: Edited {args['path']}"
-
-        if name == "multi_edit":
-            # Validate all edits first
-            backups = {}
-            for edit in args["edits"]:
-                p = Path(edit["path"])
-                if not p.exists(): return f"Error: File not found: {edit['path']}"
-                content = p.read_text()
-                if edit["old_string"] not in content:
-                    return f"Error: old_string not found in {edit['path']}"
-                backups[edit["path"]] = content
-            # Apply all edits
-            try:
-                for edit in args["edits"]:
-                    p = Path(edit["path"])
-                    content = p.read_text()
-                    p.write_text(content.replace(edit["old_string"], edit["new_string"], 1))
-                return f"OK: Applied {len(args['edits'])} edits"
-            except Exception as e:
-                # Rollback on failure
-                for path, content in backups.items():
-                    Path(path).write_text(content)
-                return f"Error: {e} (rolled back all changes)"
-
-        # === Code Search ===
-        if name == "grep":
-            path = args.get("path", ".")
-            ctx = args.get("context", 2)
-            include = f"--include='{args['include']}'" if args.get("include") else ""
-            cmd = f"grep -rn -E '{args['pattern']}' {path} {include} -B{ctx} -A{ctx} 2>/dev/null | head -200"
-            return _run_cmd(cmd) or "No matches found"
-
-        if name == "find_files":
-            path = args.get("path", ".")
-            cmd = f"find {path} -type f -name '{args['pattern']}' 2>/dev/null | head -100"
-            result = _run_cmd(cmd)
-            if not result.strip():
-                # Try with ** glob
-                cmd = f"find {path} -type f -path '*{args['pattern']}' 2>/dev/null | head -100"
-                result = _run_cmd(cmd)
-            return result or "No files found"
-
-        if name == "find_definition":
-            sym = args["name"]
-            typ = args.get("type", "any")
-            patterns = {
-                "function": f"(def|function|fn|func)\\s+{sym}\\s*\\(",
-                "class": f"(class|struct|interface|type)\\s+{sym}",
-                "variable": f"(let|const|var|val)\\s+{sym}\\s*=",
-                "any": f"(def|class|function|fn|func|struct|interface|type|let|const|var)\\s+{sym}"
-            }
-            pattern = patterns.get(typ, patterns["any"])
-            cmd = f"grep -rn -E '{pattern}' . --include='*.py' --include='*.js' --include='*.ts' --include='*.go' --include='*.rs' --include='*.java' 2>/dev/null | head -50"
-            return _run_cmd(cmd) or f"No definition found for '{sym}'"
-
-        # === Directory Operations ===
-        if name == "list_dir":
-            p = Path(args.get("path", "."))
-            if not p.exists(): return f"Error: Directory not found: {p}"
-            if args.get("recursive"):
-                depth = args.get("max_depth", 3)
-                cmd = f"find {p} -maxdepth {depth} -type f -exec ls -lh {{}} \\; 2>/dev/null | head -200"
-                return _run_cmd(cmd)
-            items = []
-            for x in sorted(p.iterdir()):
-                if x.name.startswith('.'): continue
-                size = x.stat().st_size if x.is_file() else 0
-                typ = 'd' if x.is_dir() else '-'
-                items.append(f"{typ} {size:8d}  {x.name}")
-            return '\n'.join(items) or "(empty directory)"
-
-        if name == "tree":
-            p = args.get("path", ".")
-            depth = args.get("max_depth", 3)
-            include = f"-P '{args['include']}'" if args.get("include") else ""
-            cmd = f"tree -L {depth} {include} --noreport {p} 2>/dev/null || find {p} -maxdepth {depth} -print 2>/dev/null"
-            return _truncate(_run_cmd(cmd))
-
-        # === Shell & Testing ===
-        if name == "bash":
-            timeout = args.get("timeout", 120)
-            cwd = args.get("cwd")
-            return _run_cmd(args["command"], timeout=timeout, cwd=cwd)
-
-        if name == "run_tests":
-            test_path = args.get("test_path", "")
-            pattern = args.get("pattern", "")
-            verbose = "-v" if args.get("verbose") else ""
-
-            # Auto-detect test framework
-            if Path("pytest.ini").exists() or Path("pyproject.toml").exists() or Path("setup.py").exists():
-                pattern_arg = f"-k '{pattern}'" if pattern else ""
-                cmd = f"python -m pytest {test_path} {pattern_arg} {verbose} --tb=short 2>&1"
-            elif Path("package.json").exists():
-                cmd = f"npm test -- {test_path} 2>&1"
-            elif Path("Cargo.toml").exists():
-                cmd = f"cargo test {test_path} 2>&1"
-            elif Path("go.mod").exists():
-                cmd = f"go test ./... {verbose} 2>&1"
-            else:
-                cmd = f"python -m pytest {test_path} {verbose} --tb=short 2>&1"
-
-            return _truncate(_run_cmd(cmd, timeout=300))
-
-        # === Git Operations ===
-        if name == "git_status":
-            return _run_cmd("git status --short && echo '---' && git diff --stat HEAD 2>/dev/null")
-
-        if name == "git_diff":
-            staged = "--staged" if args.get("staged") else ""
-            path = args.get("path", "")
-            return _truncate(_run_cmd(f"git diff {staged} {path}"))
-
-        if name == "git_log":
-            count = args.get("count", 10)
-            path = args.get("path", "")
-            return _run_cmd(f"git log --oneline -n {count} {path}")
-
-        # === Context & Planning ===
-        if name == "think":
-            return f"[Thought recorded: {args['thought'][:100]}...]"
-
+    fn = _TOOLS.get(name)
+    if fn is None:
         return f"Error: Unknown tool '{name}'"
-
+    try:
+        return fn(args)
     except Exception as e:
         return f"Error: {type(e).__name__}: {e}"
 
@@ -340,24 +631,83 @@ SYSTEM_PROMPT = """You are an expert software engineer solving real-world GitHub
 - Planning: think
 """
 
-def call_api(messages: list) -> dict:
-    """Make API call to Claude"""
-    data = json.dumps({
-        "model": MODEL,
-        "max_tokens": MAX_TOKENS,
-        "tools": TOOLS,
-        "messages": messages,
-        "system": SYSTEM_PROMPT
-    }).encode()
-
-    req = Request(API_URL, data=data, headers={
-        "Content-Type": "application/json",
-        "x-api-key": API_KEY,
-        "anthropic-version": "2023-06-01"
-    })
-
-    with urlopen(req, timeout=120) as res:
-        return json.loads(res.read())
+# Tools with no side effects that don't go through the shared _SHELL, so they're safe to run side by side
+_CONCURRENT_TOOLS = frozenset({"read_file", "grep", "find_files", "find_definition", "list_dir",
+                               "git_diff", "git_log", "think"})
+
+_CONN = None  # keep-alive connection reused across turns, so each call skips the TCP/TLS handshake
+
+# Only the messages change between calls, so the rest of the body (mostly the tool schemas) is encoded once
+_BODY_HEAD = json.dumps({
+    "model": MODEL,
+    "max_tokens": MAX_TOKENS,
+    "stream": True,
+    "tools": TOOLS,
+    "system": SYSTEM_PROMPT
+}).encode()[:-1] + b', "messages": '
+
+# Tool results older than the last KEEP_RECENT messages are cut down to their head before each call,
+# so the request body grows with the window rather than with the whole session
+KEEP_RECENT = 8
+ELIDE_OVER, ELIDE_KEEP = 2048, 1024
+
+def _elide_old_results(messages: list):
+    """Trim long tool results outside the recent window in place; trimmed ones are short enough to be left alone after"""
+    for i, m in enumerate(messages[:-KEEP_RECENT]):
+        if m["role"] != "user" or isinstance(m["content"], str): continue
+        for r in m["content"]:
+            if r.get("type") == "tool_result" and isinstance(r["content"], str) and len(r["content"]) > ELIDE_OVER:
+                n = len(r["content"]) - ELIDE_KEEP
+                r["content"] = r["content"][:ELIDE_KEEP] + f"\n...[elided {n} chars; turn {i // 2}]"
+
+def call_api(messages: list, on_tool=None) -> dict:
+    """Make a streaming API call to Claude; on_tool(block) fires as soon as each tool_use block is complete"""
+    data = _BODY_HEAD + json.dumps(messages).encode() + b"}"
+
+    global _CONN
+    url = urlsplit(API_URL)
+    for attempt in range(2):
+        _CONN = _CONN or (HTTPSConnection if url.scheme == "https" else HTTPConnection)(url.netloc, timeout=120)
+        try:
+            _CONN.request("POST", url.path, body=data, headers={
+                "Content-Type": "application/json",
+                "x-api-key": API_KEY,
+                "anthropic-version": "2023-06-01"
+            })
+            res = _CONN.getresponse()
+            break
+        except (RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            # Server closed the idle keep-alive connection; reconnect once
+            _CONN.close(); _CONN = None
+            if attempt: raise
+    if res.status >= 400:
+        raise RuntimeError(f"HTTP {res.status}: {res.read().decode(errors='replace')[:500]}")
+
+    # Assemble the message from SSE events; tool input arrives as partial JSON, parsed at block stop
+    content, partial, stop_reason = [], {}, None
+    for line in res:
+        if not line.startswith(b"data:"):
+            continue
+        event = json.loads(line[5:])
+        etype = event.get("type")
+        if etype == "content_block_start":
+            content.append(dict(event["content_block"]))
+        elif etype == "content_block_delta":
+            delta, i = event["delta"], event["index"]
+            if delta["type"] == "text_delta":
+                content[i]["text"] = content[i].get("text", "") + delta["text"]
+            elif delta["type"] == "input_json_delta":
+                partial.setdefault(i, []).append(delta["partial_json"])
+        elif etype == "content_block_stop":
+            block = content[event["index"]]
+            if block["type"] == "tool_use":
+                block["input"] = json.loads("".join(partial.pop(event["index"], [])) or "{}")
+                if on_tool: on_tool(block)
+        elif etype == "message_delta":
+            stop_reason = event["delta"].get("stop_reason", stop_reason)
+        elif etype == "error":
+            raise RuntimeError(f"Stream error: {event.get('error', {}).get('message', event)}")
+    return {"content": content, "stop_reason": stop_reason}
 
 def agent(prompt: str, verbose: bool = True) -> str:
     """Run the agent loop"""
@@ -368,36 +718,54 @@ def agent(prompt: str, verbose: bool = True) -> str:
         turn += 1
         if verbose: print(f"\n{'='*60}\n[Turn {turn}/{MAX_TURNS}]")
 
-        try:
-            response = call_api(messages)
-        except Exception as e:
-            print(f"API Error: {e}")
-            return f"Error: API call failed: {e}"
+        with ThreadPoolExecutor(max_workers=8) as ex:
+            # Read-only tools start while the rest of the response is still streaming, up to the
+            # first tool that isn't read-only; everything from there on waits for the full message
+            early, barrier = {}, False
 
-        messages.append({"role": "assistant", "content": response["content"]})
-
-        # Print assistant's text response
-        for block in response["content"]:
-            if block["type"] == "text" and block.get("text"):
-                if verbose: print(f"\n{block['text'][:500]}{'...' if len(block['text']) > 500 else ''}")
-
-        # Check if done
-        if response["stop_reason"] != "tool_use":
-            final = "".join(b.get("text", "") for b in response["content"] if b["type"] == "text")
-            return final
-
-        # Execute tools
-        results = []
-        for block in response["content"]:
-            if block["type"] == "tool_use":
-                tool_name = block["name"]
-                tool_input = block["input"]
-
-                if verbose: print(f"\n⚡ {tool_name}: {str(tool_input)[:80]}...")
-
-                result = run_tool(tool_name, tool_input)
+            def on_tool(block):
+                nonlocal barrier
+                if block["name"] in _CONCURRENT_TOOLS and not barrier:
+                    early[block["id"]] = ex.submit(run_tool, block["name"], block["input"])
+                else:
+                    barrier = True
 
+            _elide_old_results(messages)
+            try:
+                response = call_api(messages, on_tool)
+            except Exception as e:
+                print(f"API Error: {e}")
+                return f"Error: API call failed: {e}"
+
+            messages.append({"role": "assistant", "content": response["content"]})
+
+            # Print assistant's text response
+            for block in response["content"]:
+                if block["type"] == "text" and block.get("text"):
+                    if verbose: print(f"\n{block['text'][:500]}{'...' if len(block['text']) > 500 else ''}")
+
+            # Check if done
+            if response["stop_reason"] != "tool_use":
+                final = "".join(b.get("text", "") for b in response["content"] if b["type"] == "text")
+                return final
+
+            # Execute tools: read-only ones run concurrently, anything else waits for them and runs in order
+            blocks = [b for b in response["content"] if b["type"] == "tool_use"]
+            outputs = []
+            for block in blocks:
+                if block["id"] in early:
+                    outputs.append(early[block["id"]])
+                elif block["name"] in _CONCURRENT_TOOLS:
+                    outputs.append(ex.submit(run_tool, block["name"], block["input"]))
+                else:
+                    wait([o for o in outputs if isinstance(o, Future)])
+                    outputs.append(run_tool(block["name"], block["input"]))
+
+            results = []
+            for block, out in zip(blocks, outputs):
+                result = out.result() if isinstance(out, Future) else out
                 if verbose:
+                    print(f"\n⚡ {block['name']}: {str(block['input'])[:80]}...")
                     preview = result[:200] + "..." if len(result) > 200 else result
                     print(f"   → {preview}")
 
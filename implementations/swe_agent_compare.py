@@ -4,24 +4,33 @@ SWE-bench Agent Comparison
 Compare different nano-opencode agent versions on the same instances.
 """
 
+import asyncio
+import contextlib
+import functools
+import hashlib
 import json
 import os
+import random
+import sqlite3
 import subprocess
+import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-import litellm
-from datasets import load_dataset
+from _env import load_api_config
+from _jsonutil import canonical_json, json_loads
+from _swebench import load_jsonl
 
-litellm.set_verbose = False
+load_api_config()
 
-# Load API config
-config_path = Path.home() / ".config" / "mini-swe-agent" / ".env"
-if config_path.exists():
-    for line in config_path.read_text().splitlines():
-        if '=' in line and not line.startswith('#'):
-            k, v = line.split('=', 1)
-            os.environ[k.strip()] = v.strip()
+# litellm, datasets and docker each take a while to import (docker also connects to the daemon),
+# so they load on first use and `--help` or a cache-only rerun doesn't pay for them
+@functools.lru_cache(maxsize=None)
+def _litellm():
+    import litellm
+    litellm.set_verbose = False
+    return litellm
 
 # =============================================================================
 # AGENT VERSIONS TO COMPARE
@@ -87,23 +96,66 @@ BASH_TOOLS = [
      "input_schema": {"type": "object", "properties": {"command": {"type": "string"}}, "required": ["command"]}},
 ]
 
+CACHE_CONTROL = {"type": "ephemeral"}
+
+def _canonicalize(obj):
+    """Deep copy of obj with every dict's keys in sorted order (lists keep their order)"""
+    return json.loads(json.dumps(obj, sort_keys=True))
+
+def _litellm_tools(tools: list) -> list:
+    """OpenAI-format tool list, built once, byte-stable across calls, last tool marked as a cache breakpoint"""
+    out = [{"type": "function", "function": _canonicalize({"name": t["name"], "description": t["description"],
+                                                           "parameters": t["input_schema"]})} for t in tools]
+    out[-1]["cache_control"] = CACHE_CONTROL
+    return out
+
+# Serialized the same way on every request, so the tools prefix never drifts out of the prompt cache
+LITELLM_TOOLS = {"structured": _litellm_tools(STRUCTURED_TOOLS), "bash": _litellm_tools(BASH_TOOLS)}
+# ...and dumped once per mode for ResultCache keys; nothing may mutate the lists after this point
+LITELLM_TOOLS_JSON = {mode: json.dumps(tools, sort_keys=True) for mode, tools in LITELLM_TOOLS.items()}
+
 # =============================================================================
 # DOCKER ENVIRONMENT
 # =============================================================================
 
+# One client per process: pulls and container bookkeeping share its connection pool instead of
+# forking a docker CLI each time. exec and cp stay on the CLI, which can be killed on timeout.
+@functools.lru_cache(maxsize=None)
+def _docker():
+    import docker
+    return docker.from_env()
+
+def _pull(image: str):
+    """Pull an image; a failure only gets logged, the container start reports it properly."""
+    from docker.errors import DockerException
+    try:
+        _docker().images.pull(image)
+    except DockerException as e:
+        print(f"  Pull failed for {image}: {e}")
+
+def _container_call(method: str, name: str, **kwargs):
+    """pause/unpause/remove_container by name, ignoring errors the way the CLI calls did"""
+    from docker.errors import APIError
+    try:
+        getattr(_docker().api, method)(name, **kwargs)
+    except APIError:
+        pass
+
 class DockerEnv:
     def __init__(self):
         self.container_id = ""
+        self.name = ""
         self.timeout = 120
 
-    def start(self, image: str):
+    def start(self, image: str, name: str = ""):
         import uuid
-        name = f"swe-cmp-{uuid.uuid4().hex[:8]}"
+        name = name or f"swe-cmp-{uuid.uuid4().hex[:8]}"
         r = subprocess.run(["docker", "run", "-d", "--name", name, "-w", "/testbed", "--rm", image, "sleep", "2h"],
                           capture_output=True, text=True, timeout=300)
         if r.returncode != 0:
             raise RuntimeError(f"Docker failed: {r.stderr}")
         self.container_id = r.stdout.strip()
+        self.name = name
 
     def run_cmd(self, cmd: str) -> dict:
         try:
@@ -118,8 +170,23 @@ class DockerEnv:
         return r["output"] if r["code"] == 0 else f"Error: {r['output']}"
 
     def write_file(self, path: str, content: str) -> str:
-        r = self.run_cmd(f"cat > '{path}' << 'EOF'\n{content}\nEOF")
-        return "OK" if r["code"] == 0 else f"Error: {r['output']}"
+        # docker cp streams the file through the daemon instead of a shell heredoc,
+        # so content containing EOF, backticks or $ lands byte-for-byte
+        dest = path if path.startswith("/") else f"/testbed/{path}"
+        with tempfile.NamedTemporaryFile("w", delete=False) as tf:
+            tf.write(content)
+        try:
+            # docker cp applies the host file's mode; keep the existing file's so the patch has no mode change
+            mode = subprocess.run(["docker", "exec", self.container_id, "stat", "-c", "%a", dest],
+                                  capture_output=True, text=True, timeout=self.timeout)
+            os.chmod(tf.name, int(mode.stdout, 8) if mode.returncode == 0 else 0o644)
+            r = subprocess.run(["docker", "cp", tf.name, f"{self.container_id}:{dest}"],
+                              capture_output=True, text=True, timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            return "Error: Timeout"
+        finally:
+            os.unlink(tf.name)
+        return "OK" if r.returncode == 0 else f"Error: {r.stdout + r.stderr}"
 
     def grep(self, pattern: str, path: str = ".") -> str:
         return self.run_cmd(f"grep -rn '{pattern}' '{path}' 2>/dev/null | head -50")["output"] or "No matches"
@@ -137,23 +204,144 @@ class DockerEnv:
         if self.container_id:
             subprocess.run(["docker", "stop", self.container_id], capture_output=True, timeout=30)
 
+CONCURRENCY = 8    # instances in flight at once
+DOCKER_STARTS = 4  # concurrent `docker run`s
+PULL_WORKERS = 4   # concurrent image pulls
+
+def _container_state(name: str) -> str:
+    """"running", "paused", "exited", ... or "" if there is no such container"""
+    from docker.errors import NotFound
+    try:
+        return _docker().api.inspect_container(name)["State"]["Status"]
+    except NotFound:
+        return ""
+
+REUSE_MODES = ("none", "pause", "keep_alive")
+
+class DockerEnvPool:
+    """Hands out a container per (image, agent) run.
+
+    reuse="none" starts a fresh container and stops it afterwards. With "keep_alive" or "pause",
+    containers are named per (image, slot) and outlive the run: keep_alive leaves them running,
+    pause freezes them between uses. A reused container gets its workspace reset before handing out.
+    """
+
+    def __init__(self, reuse: str = "none", starts: int = DOCKER_STARTS):
+        self.reuse = reuse
+        self.start_sem = asyncio.Semaphore(starts)  # bounds concurrent `docker run`s
+        self.in_use = set()
+
+    async def acquire(self, image: str) -> DockerEnv:
+        env = DockerEnv()
+        if self.reuse == "none":
+            async with self.start_sem:
+                await asyncio.to_thread(env.start, image)
+            return env
+        prefix, slot = f"swe-cmp-{hashlib.sha256(image.encode()).hexdigest()[:12]}", 0
+        while f"{prefix}-{slot}" in self.in_use:
+            slot += 1
+        name = f"{prefix}-{slot}"
+        self.in_use.add(name)
+        try:
+            state = await asyncio.to_thread(_container_state, name)
+            if state == "paused":
+                await asyncio.to_thread(_container_call, "unpause", name)
+            if state in ("running", "paused"):
+                env.container_id = env.name = name
+                # Keep ignored files (-x would drop in-place built extensions in SWE-bench images)
+                r = await asyncio.to_thread(env.run_cmd, "git reset --hard HEAD && git clean -fd")
+                if r["code"] == 0:
+                    return env
+            if state:  # unusable leftover; rm -f is synchronous, unlike stop on a --rm container
+                await asyncio.to_thread(_container_call, "remove_container", name, force=True)
+            async with self.start_sem:
+                await asyncio.to_thread(env.start, image, name)
+            return env
+        except Exception:
+            self.in_use.discard(name)
+            raise
+
+    async def release(self, env: DockerEnv):
+        if self.reuse == "none":
+            await asyncio.to_thread(env.stop)
+            return
+        if self.reuse == "pause" and env.container_id:
+            await asyncio.to_thread(_container_call, "pause", env.name)
+        self.in_use.discard(env.name)
+
 # =============================================================================
 # AGENT
 # =============================================================================
 
+MODEL = "anthropic/claude-sonnet-4-20250514"
+
+# USD per token, by model name without the provider prefix. Cache reads bill at 0.1x input, writes at 1.25x.
+PRICING = {
+    "claude-sonnet-4-20250514": {"in": 3e-6, "out": 15e-6, "cache_read": 3e-7, "cache_write": 3.75e-6},
+}
+
+# Rate limits, overloads and dropped connections are retried with full-jitter exponential backoff
+API_RETRIES = 5
+API_BACKOFF_MAX = 30  # seconds
+
+def _retryable(e: Exception) -> bool:
+    lt = _litellm()
+    return isinstance(e, (lt.RateLimitError, lt.APIConnectionError, lt.Timeout, lt.InternalServerError,
+                          lt.ServiceUnavailableError, lt.APIError))
+
+# Tool results older than the last KEEP_TOOL_RESULTS are stubbed, so the prompt stops growing with every turn
+KEEP_TOOL_RESULTS = 6
+
+# Read-only tools have no ordering dependency on each other; consecutive calls to them run concurrently
+PARALLEL_TOOLS = frozenset({"read_file", "grep", "find", "list_dir"})
+WRITE_TOOLS = frozenset({"write_file", "edit_file", "bash"})
+
+# Triage mode: one call drafts plans for TRIAGE_BATCH problems at once, each agent starts from its plan
+TRIAGE_BATCH = 4
+TRIAGE_SYSTEM = """You triage GitHub issues for engineers who will fix them in /testbed.
+Each issue is in a <row id="N"> block. For every row, write a short plan: files or functions
+to inspect first, a likely cause, and how to verify the fix.
+Reply with only a JSON array: [{"id": N, "plan": "..."}, ...]"""
+
 class Agent:
-    def __init__(self, env: DockerEnv, config: dict, model: str = "anthropic/claude-sonnet-4-20250514"):
+    def __init__(self, env: DockerEnv, config: dict, model: str = MODEL):
         self.env = env
         self.config = config
         self.model = model
         self.messages = []
         self.tool_calls = 0
-        self.cost = 0.0
+        self.tokens = {"in": 0, "out": 0, "cache_read": 0, "cache_write": 0}
         self.done = False
         self.patch = ""
+        self._tool_cache = {}
+        self._touched_fs = False  # until a tool that can write runs, the workspace diff is empty
+
+    @property
+    def pricing(self) -> dict:
+        return PRICING.get(self.model.rsplit("/", 1)[-1], PRICING[MODEL.rsplit("/", 1)[-1]])
+
+    @property
+    def cost(self) -> float:
+        return sum(n * self.pricing[kind] for kind, n in self.tokens.items())
+
+    @property
+    def cache_savings(self) -> float:
+        """What the cache reads would have cost as uncached input, minus what they did cost"""
+        return self.tokens["cache_read"] * (self.pricing["in"] - self.pricing["cache_read"])
 
     def exec_tool(self, name: str, args: dict) -> str:
         self.tool_calls += 1
+        # Read-only results are memoized for the session; any other tool may change the tree, so it clears them
+        if name not in PARALLEL_TOOLS:
+            self._tool_cache.clear()
+            self._touched_fs = self._touched_fs or name in WRITE_TOOLS
+            return self._exec_tool(name, args)
+        key = (name, canonical_json(args))
+        if key not in self._tool_cache:
+            self._tool_cache[key] = self._exec_tool(name, args)
+        return self._tool_cache[key]
+
+    def _exec_tool(self, name: str, args: dict) -> str:
         if name == "read_file": return self.env.read_file(args["path"])
         if name == "write_file": return self.env.write_file(args["path"], args["content"])
         if name == "edit_file":
@@ -176,119 +364,325 @@ class Agent:
             return f"Submitted: {args.get('summary', '')}"
         return f"Unknown: {name}"
 
-    def run(self, problem: str, max_turns: int = 40) -> tuple[str, str]:
-        tools_list = STRUCTURED_TOOLS if self.config["tools"] == "structured" else BASH_TOOLS
-        tools = [{"type": "function", "function": {"name": t["name"], "description": t["description"],
-                  "parameters": t["input_schema"]}} for t in tools_list]
-
+    def elide_old_results(self):
+        """Stub out all but the last KEEP_TOOL_RESULTS tool results; the system prompt and
+        problem statement are left alone so the cached prefix stays valid."""
+        kept = 0
+        for m in reversed(self.messages):
+            if m["role"] != "tool":
+                continue
+            kept += 1
+            if kept <= KEEP_TOOL_RESULTS:
+                continue
+            if m["content"].startswith("<elided"):
+                break  # everything before this was stubbed on an earlier turn
+            m["content"] = f"<elided {len(m['content'])} bytes>"
+
+    @staticmethod
+    async def batch_plan(instances: list, model: str = MODEL) -> list:
+        """Draft an initial plan for several instances in one LLM call; "" for any row the reply misses."""
+        rows = "\n\n".join(f'<row id="{i}">\n{inst["problem_statement"]}\n</row>' for i, inst in enumerate(instances))
+        plans = [""] * len(instances)
+        try:
+            resp = await _litellm().acompletion(
+                model=model, messages=[{"role": "system", "content": TRIAGE_SYSTEM}, {"role": "user", "content": rows}],
+                max_tokens=512 * len(instances), api_key=os.environ.get("ANTHROPIC_API_KEY"),
+                base_url=os.environ.get("ANTHROPIC_BASE_URL"))
+            text = resp.choices[0].message.content or ""
+            for row in json.loads(text[text.index("["):text.rindex("]") + 1]):
+                if isinstance(row, dict) and 0 <= int(row.get("id", -1)) < len(plans):
+                    plans[int(row["id"])] = str(row.get("plan", ""))
+        except Exception as e:  # triage is best-effort; agents just start without a plan
+            print(f"  Triage failed for {len(instances)} instances: {e}")
+        return plans
+
+    async def chain_tool(self, after: list, name: str, args: dict) -> str:
+        """Run a tool once the tasks it depends on have finished."""
+        if after:
+            await asyncio.wait(after)
+        # Tools are blocking docker calls; run them off the event loop
+        return await asyncio.to_thread(self.exec_tool, name, args)
+
+    async def final_patch(self) -> str:
+        """git diff of the workspace, skipped when no tool could have changed it"""
+        return await asyncio.to_thread(self.env.get_patch) if self._touched_fs else ""
+
+    async def run(self, problem: str, max_turns: int = 40, plan: str = "") -> tuple[str, str]:
+        tools = LITELLM_TOOLS[self.config["tools"]]
+
+        # Prompt caching: tools, system prompt and problem statement are the same on every turn,
+        # so each ends in a cache breakpoint and turns 2..N read that prefix from the cache
         self.messages = [
-            {"role": "system", "content": self.config["system"]},
-            {"role": "user", "content": f"Fix this issue in /testbed:\n\n{problem}"}
+            {"role": "system", "content": [{"type": "text", "text": self.config["system"], "cache_control": CACHE_CONTROL}]},
+            {"role": "user", "content": [{"type": "text", "text": f"Fix this issue in /testbed:\n\n{problem}"
+                                                                  + (f"\n\nInitial plan:\n{plan}" if plan else ""),
+                                          "cache_control": CACHE_CONTROL}]}
         ]
 
         for turn in range(max_turns):
-            try:
-                resp = litellm.completion(
-                    model=self.model, messages=self.messages, tools=tools, tool_choice="auto",
-                    max_tokens=4096, api_key=os.environ.get("ANTHROPIC_API_KEY"),
-                    base_url=os.environ.get("ANTHROPIC_BASE_URL"))
-            except Exception as e:
-                return "Error", str(e)
-
-            if hasattr(resp, 'usage') and resp.usage:
-                self.cost += getattr(resp.usage, 'prompt_tokens', 0) * 0.003 / 1000
-                self.cost += getattr(resp.usage, 'completion_tokens', 0) * 0.015 / 1000
-
-            msg = resp.choices[0].message
-            tcs = getattr(msg, 'tool_calls', None) or []
-
+            # Stream the response and start each tool as soon as its arguments parse, so
+            # docker work overlaps the rest of the generation. Consecutive read-only tools run
+            # concurrently; any other tool waits for everything before it and blocks what follows.
+            def dispatch(idx, args):
+                nonlocal barrier
+                # Serialized once here; this canonical form is what goes back into history
+                calls[idx]["arguments"] = canonical_json(args)
+                name = calls[idx]["name"]
+                if name in PARALLEL_TOOLS:
+                    after = [barrier] if barrier else []
+                    pending[idx] = asyncio.create_task(self.chain_tool(after, name, args))
+                else:
+                    pending[idx] = barrier = asyncio.create_task(self.chain_tool(list(pending.values()), name, args))
+
+            for attempt in range(API_RETRIES):
+                content, calls, pending = [], {}, {}
+                usage = finish_reason = None
+                barrier = None
+                try:
+                    stream = await _litellm().acompletion(
+                        model=self.model, messages=self.messages, tools=tools, tool_choice="auto",
+                        max_tokens=4096, api_key=os.environ.get("ANTHROPIC_API_KEY"),
+                        base_url=os.environ.get("ANTHROPIC_BASE_URL"),
+                        stream=True, stream_options={"include_usage": True})
+                    async for chunk in stream:
+                        usage = getattr(chunk, 'usage', None) or usage
+                        if not chunk.choices:
+                            continue
+                        choice = chunk.choices[0]
+                        finish_reason = choice.finish_reason or finish_reason
+                        delta = choice.delta
+                        if delta.content:
+                            content.append(delta.content)
+                        for d in getattr(delta, 'tool_calls', None) or []:
+                            call = calls.setdefault(d.index, {"id": "", "name": "", "arguments": ""})
+                            call["id"] = d.id or call["id"]
+                            if d.function:
+                                call["name"] += d.function.name or ""
+                                call["arguments"] += d.function.arguments or ""
+                            if d.index in pending or not call["arguments"]:
+                                continue
+                            try:
+                                args = json_loads(call["arguments"])
+                            except ValueError:
+                                continue
+                            dispatch(d.index, args)
+                    # Calls with no arguments never parse mid-stream; start them now
+                    for idx in sorted(calls):
+                        if idx not in pending:
+                            dispatch(idx, json_loads(calls[idx]["arguments"]) if calls[idx]["arguments"] else {})
+                    break
+                except Exception as e:
+                    # A retry replays the whole turn, so it is only safe before any tool has started
+                    if pending or attempt == API_RETRIES - 1 or not _retryable(e):
+                        await asyncio.gather(*pending.values(), return_exceptions=True)
+                        return "Error", str(e)
+                    await asyncio.sleep(random.uniform(0, min(API_BACKOFF_MAX, 2 ** attempt)))
+
+            if usage:
+                # prompt_tokens includes cached tokens; "in" counts only the uncached remainder
+                cache_read = getattr(usage, 'cache_read_input_tokens', 0) or 0
+                cache_write = getattr(usage, 'cache_creation_input_tokens', 0) or 0
+                self.tokens["in"] += max(0, (getattr(usage, 'prompt_tokens', 0) or 0) - cache_read - cache_write)
+                self.tokens["out"] += getattr(usage, 'completion_tokens', 0) or 0
+                self.tokens["cache_read"] += cache_read
+                self.tokens["cache_write"] += cache_write
+
+            tcs = [calls[idx] for idx in sorted(calls)]
+
+            # Arguments go back into history in canonical (sorted-key) form, so replaying
+            # the transcript always produces the same bytes and keeps the cached prefix valid
             self.messages.append({
-                "role": "assistant", "content": msg.content or "",
-                "tool_calls": [{"id": tc.id, "type": "function",
-                               "function": {"name": tc.function.name, "arguments": tc.function.arguments}}
+                "role": "assistant", "content": "".join(content),
+                "tool_calls": [{"id": tc["id"], "type": "function",
+                               "function": {"name": tc["name"], "arguments": tc["arguments"]}}
                               for tc in tcs] if tcs else None
             })
 
-            for tc in tcs:
-                args = json.loads(tc.function.arguments) if tc.function.arguments else {}
-                result = self.exec_tool(tc.function.name, args)
-                self.messages.append({"role": "tool", "tool_call_id": tc.id, "content": result})
+            for idx in sorted(calls):
+                result = await pending[idx]
+                self.messages.append({"role": "tool", "tool_call_id": calls[idx]["id"], "content": result})
+            self.elide_old_results()
 
             if self.done:
                 return "Submitted", self.patch
-            if resp.choices[0].finish_reason == "stop" and not tcs:
-                self.patch = self.env.get_patch()
+            if finish_reason == "stop" and not tcs:
+                self.patch = await self.final_patch()
                 return "EndTurn", self.patch
 
-        self.patch = self.env.get_patch()
+        self.patch = await self.final_patch()
         return "MaxTurns", self.patch
 
 # =============================================================================
 # MAIN
 # =============================================================================
 
+class ResultCache:
+    """Exact-match on-disk cache of finished agent runs (SQLite), so repeated experiments skip the LLM loop."""
+
+    def __init__(self, path: Path = Path(".nano_cache") / "results.db", ttl: int = 86400):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT, expires REAL)")
+        self.ttl = ttl
+
+    @staticmethod
+    def key(model: str, image: str, config: dict, problem: str, triage: bool = False) -> str:
+        # The image pins repo and base commit; a patch made in one checkout says nothing about another
+        parts = [model, image, config["system"], problem, LITELLM_TOOLS_JSON[config["tools"]]] + (["triage"] if triage else [])
+        return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+    def get(self, key: str):
+        row = self.db.execute("SELECT value FROM results WHERE key = ? AND expires > ?", (key, time.time())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: dict):
+        self.db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?)", (key, json.dumps(value), time.time() + self.ttl))
+        self.db.commit()
+
 def get_image(inst: dict) -> str:
     iid = inst["instance_id"].replace("__", "_1776_")
     return f"docker.io/swebench/sweb.eval.x86_64.{iid}:latest".lower()
 
-def run_comparison(instances: list, agents: list, output_dir: Path):
+def _reused(result: dict, iid: str) -> dict:
+    """A stored or shared run reported for iid: flagged, with nothing counted as spent again"""
+    return {**result, "instance_id": iid, "tools": 0, "cost": 0, "cache_savings": 0, "reused": True}
+
+async def _run_one(agent_id: str, image: str, inst: dict, pool: DockerEnvPool,
+                   cache: ResultCache = None, plan: str = None, runs: dict = None) -> dict:
+    """Run one agent on one instance, or reuse a cached or in-progress run of the same prompt; never raises"""
+    iid = inst["instance_id"]
+    cfg = AGENTS[agent_id]
+    key = ResultCache.key(MODEL, image, cfg, inst["problem_statement"], plan is not None)
+    if cache and (hit := cache.get(key)):
+        print(f"  >> {iid} {cfg['name']}: cached, Status: {hit['status']}, Patch: {len(hit['model_patch'])} chars")
+        return _reused(hit, iid)
+    if runs is None:
+        return await _run_fresh(cfg, image, inst, pool, cache, key, plan)
+    # Instances with the same problem text and image start from the same prompt in the same
+    # checkout, so within one sweep they share a single run instead of each paying for the LLM turns
+    if key in runs:
+        print(f"  >> {iid} {cfg['name']}: same problem and image as an earlier instance, reusing its run")
+        return _reused(await runs[key], iid)
+    runs[key] = asyncio.ensure_future(_run_fresh(cfg, image, inst, pool, cache, key, plan))
+    return {**await runs[key], "instance_id": iid}
+
+async def _run_fresh(cfg: dict, image: str, inst: dict, pool: DockerEnvPool,
+                     cache: ResultCache, key: str, plan: str = None) -> dict:
+    """Run one agent on one instance in a container from the pool; never raises"""
+    iid = inst["instance_id"]
+    env = None
+    try:
+        env = await pool.acquire(image)
+        agent = Agent(env, cfg, MODEL)
+        status, patch = await agent.run(inst["problem_statement"], plan=plan or "")
+        has_patch = "Y" if patch else "N"
+        print(f"  >> {iid} {cfg['name']}: [{has_patch}] Status: {status}, Tools: {agent.tool_calls}, Cost: ${agent.cost:.2f}, Patch: {len(patch)} chars")
+        result = {
+            "instance_id": iid,
+            "model_patch": patch,
+            "status": status,
+            "tools": agent.tool_calls,
+            "cost": agent.cost,
+            "cache_savings": agent.cache_savings,
+        }
+        if cache and status != "Error":  # API failures are retried next time
+            cache.set(key, result)
+        return result
+    except Exception as e:
+        print(f"  >> {iid} {cfg['name']}: Error: {e}")
+        return {"instance_id": iid, "model_patch": "", "status": f"Error: {e}"}
+    finally:
+        if env:
+            await pool.release(env)
+
+def _pred(agent_id: str, result: dict) -> dict:
+    return {"instance_id": result["instance_id"], "model_name_or_path": f"nano-{agent_id}",
+            "model_patch": result["model_patch"]}
+
+async def run_comparison(instances: list, agents: list, output_dir: Path, concurrency: int = CONCURRENCY,
+                         cache: ResultCache = None, reuse: str = "none", triage: bool = False):
     output_dir.mkdir(parents=True, exist_ok=True)
-    results = {a: {} for a in agents}
-
-    for i, inst in enumerate(instances):
-        iid = inst["instance_id"]
+    # Finished runs are appended to preds_<agent>.jsonl as they complete, so an
+    # interrupted comparison resumes where it stopped
+    results = {a: {iid: _reused(row, iid) for iid, row in load_jsonl(output_dir / f"preds_{a}.jsonl").items()}
+               for a in agents}
+    done = sum(1 for inst in instances if all(inst["instance_id"] in results[a] for a in agents))
+    if done:
+        print(f"Resuming: {done} instances already done")
+    # Instances run side by side up to `concurrency`; container starts get their own,
+    # smaller limit (in the pool) so a burst of instances doesn't thrash the docker daemon
+    sem = asyncio.Semaphore(concurrency)
+    pool = DockerEnvPool(reuse)
+    runs = {}  # ResultCache.key -> task, shared by instances with identical problems and images
+
+    async def bounded(i: int, inst: dict):
+        async with sem:
+            iid = inst["instance_id"]
+            todo = [a for a in agents if iid not in results[a]]
+            if not todo:
+                return
+            image = get_image(inst)
+            print(f"[{i+1}/{len(instances)}] {iid}")
+
+            # Wait only for this instance's image; later pulls keep going in the background
+            if image in pulls:
+                await asyncio.wrap_future(pulls[image])
+
+            # Agents are independent (own container, own history), so their LLM round-trips overlap too
+            plan = plans.get(iid, "") if triage else None
+            outcomes = await asyncio.gather(*(_run_one(agent_id, image, inst, pool, cache, plan, runs) for agent_id in todo))
+            for agent_id, outcome in zip(todo, outcomes):
+                results[agent_id][iid] = outcome
+                if outcome["status"].startswith("Error"):  # errors are retried on resume
+                    continue
+                # Appended as each instance finishes, so a crash keeps everything done so far
+                streams[agent_id].write(canonical_json(_pred(agent_id, outcome)) + "\n")
+                streams[agent_id].flush()
+
+    def cached(inst: dict) -> bool:
+        """Every agent's run is already in the preds file or the result cache"""
         image = get_image(inst)
-
-        print(f"\n{'='*60}")
-        print(f"[{i+1}/{len(instances)}] {iid}")
-        print(f"{'='*60}")
-
-        # Pull image once
-        subprocess.run(["docker", "pull", image], capture_output=True, timeout=600)
-
-        for agent_id in agents:
-            cfg = AGENTS[agent_id]
-            print(f"\n  >> {cfg['name']}")
-
-            env = DockerEnv()
-            try:
-                env.start(image)
-                agent = Agent(env, cfg)
-                status, patch = agent.run(inst["problem_statement"])
-
-                results[agent_id][iid] = {
-                    "instance_id": iid,
-                    "model_patch": patch,
-                    "status": status,
-                    "tools": agent.tool_calls,
-                    "cost": agent.cost,
-                }
-                has_patch = "Y" if patch else "N"
-                print(f"     [{has_patch}] Status: {status}, Tools: {agent.tool_calls}, Cost: ${agent.cost:.2f}, Patch: {len(patch)} chars")
-
-            except Exception as e:
-                print(f"     Error: {e}")
-                results[agent_id][iid] = {"instance_id": iid, "model_patch": "", "status": f"Error: {e}"}
-            finally:
-                env.stop()
-
-    # Save predictions for each agent
+        return all(inst["instance_id"] in results[a] or
+                   bool(cache) and cache.get(ResultCache.key(MODEL, image, AGENTS[a], inst["problem_statement"], triage))
+                   for a in agents)
+
+    # Start every pull up front (each distinct image once, none for instances whose runs are all done or
+    # cached) so they overlap with triage and with agent runs on earlier instances
+    needed = dict.fromkeys(get_image(inst) for inst in instances if not cached(inst))
+    with contextlib.ExitStack() as stack, ThreadPoolExecutor(max_workers=PULL_WORKERS) as pull_pool:
+        streams = {a: stack.enter_context(open(output_dir / f"preds_{a}.jsonl", "a")) for a in agents}
+        pulls = {image: pull_pool.submit(_pull, image)
+                 for image in needed}
+
+        plans = {}
+        if triage:
+            todo = [inst for inst in instances if not cached(inst)]
+            batches = [todo[i:i + TRIAGE_BATCH] for i in range(0, len(todo), TRIAGE_BATCH)]
+            for batch, batch_plans in zip(batches, await asyncio.gather(*(Agent.batch_plan(b) for b in batches))):
+                plans.update((inst["instance_id"], p) for inst, p in zip(batch, batch_plans))
+
+        await asyncio.gather(*(bounded(i, inst) for i, inst in enumerate(instances)))
+
+    # Save predictions for each agent (the .jsonl files already hold the same rows)
     for agent_id in agents:
-        preds = {iid: {"instance_id": iid, "model_name_or_path": f"nano-{agent_id}", "model_patch": r["model_patch"]}
-                 for iid, r in results[agent_id].items()}
+        preds = {iid: _pred(agent_id, r) for iid, r in results[agent_id].items()}
         (output_dir / f"preds_{agent_id}.json").write_text(json.dumps(preds, indent=2))
 
     # Summary table
-    print(f"\n{'='*60}")
+    print(f"\n{'='*84}")
     print("COMPARISON SUMMARY")
-    print(f"{'='*60}")
-    print(f"{'Agent':<25} | {'Patches':<10} | {'Tools':<8} | {'Cost':<8}")
-    print("-" * 60)
+    print(f"{'='*84}")
+    # Tools, cost and savings cover only runs made this time; reused ones (resumed, cached
+    # or shared with an identical instance) are counted in their own column
+    print(f"{'Agent':<25} | {'Patches':<10} | {'Reused':<6} | {'Tools':<8} | {'Cost':<8} | {'Cache saved':<8}")
+    print("-" * 84)
     for agent_id in agents:
         patches = sum(1 for r in results[agent_id].values() if r.get("model_patch"))
+        reused = sum(1 for r in results[agent_id].values() if r.get("reused"))
         tools = sum(r.get("tools", 0) for r in results[agent_id].values())
         cost = sum(r.get("cost", 0) for r in results[agent_id].values())
-        print(f"{AGENTS[agent_id]['name']:<25} | {patches}/{len(instances):<8} | {tools:<8} | ${cost:.2f}")
+        saved = sum(r.get("cache_savings", 0) for r in results[agent_id].values())
+        print(f"{AGENTS[agent_id]['name']:<25} | {patches}/{len(instances):<8} | {reused:<6} | {tools:<8} | ${cost:<7.2f} | ${saved:.2f}")
 
     print(f"\nPredictions saved to: {output_dir}")
     print("\nTo evaluate:")
@@ -303,13 +697,23 @@ def main():
     parser.add_argument("-n", "--num", type=int, default=5, help="Number of instances")
     parser.add_argument("-a", "--agents", nargs="+", default=["minimal", "expert", "workflow"], help="Agents to test")
     parser.add_argument("-o", "--output", default="./agent_comparison", help="Output directory")
+    parser.add_argument("-j", "--concurrency", type=int, default=CONCURRENCY, help="Instances to run at once")
+    parser.add_argument("--reuse", choices=REUSE_MODES, default="none",
+                        help="Keep containers between runs: running (keep_alive) or paused (pause)")
+    parser.add_argument("--triage", action="store_true",
+                        help=f"Seed each agent with a plan drafted for {TRIAGE_BATCH} instances per LLM call")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore and don't update the .nano_cache result cache")
     args = parser.parse_args()
 
     print("Loading SWE-bench Lite...")
-    instances = list(load_dataset("princeton-nlp/SWE-bench_Lite", split="dev"))[:args.num]
+    from datasets import load_dataset
+    ds = load_dataset("princeton-nlp/SWE-bench_Lite", split="dev")
+    instances = [ds[i] for i in range(min(args.num, len(ds)))]
     print(f"Testing {len(instances)} instances with agents: {args.agents}")
 
-    run_comparison(instances, args.agents, Path(args.output))
+    cache = None if args.no_cache else ResultCache()
+    asyncio.run(run_comparison(instances, args.agents, Path(args.output), args.concurrency, cache, args.reuse,
+                               args.triage))
 
 if __name__ == "__main__":
     main()
@@ -14,14 +14,20 @@ Usage:
 
 import os
 import sys
+import atexit
 import json
 import time
+import hashlib
 import shutil
+import signal
 import subprocess
 import tempfile
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from dataclasses import dataclass, field
-from typing import List, Dict, Any, Optional
+from dataclasses import dataclass, field, asdict, replace
+from typing import List, Dict, Any, Mapping, Optional
 from datetime import datetime
 
 # Load .env file if exists
@@ -30,9 +36,14 @@ def load_env():
         Path(__file__).parent / ".env",
         Path(__file__).parent.parent / ".env",
     ]
+    # Both files are read: setdefault lets the script-local .env win per key, the parent fills the rest
     for env_path in env_paths:
-        if env_path.exists():
-            for line in env_path.read_text().split("\n"):
+        try:
+            f = open(env_path)
+        except OSError:
+            continue
+        with f:
+            for line in f:
                 if "=" in line and not line.startswith("#"):
                     key, _, value = line.partition("=")
                     os.environ.setdefault(key.strip(), value.strip())
@@ -43,12 +54,12 @@ load_env()
 # TEST CASES - SWE-bench style tasks
 # ═══════════════════════════════════════════════════════════════════════════════
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class TestCase:
     id: str
     name: str
     difficulty: str  # easy, medium, hard
-    setup_files: Dict[str, str]
+    setup_files: Mapping[str, str]
     prompt: str
     validation_cmd: str  # Command to validate the fix
     expected_output: str  # Expected substring in validation output
@@ -363,11 +374,17 @@ if __name__ == "__main__": test()
     ),
 ]
 
+# Built once at import so --test / --difficulty are lookups rather than scans of TEST_CASES
+TESTS_BY_ID: Dict[str, TestCase] = {t.id: t for t in TEST_CASES}
+TESTS_BY_DIFF: Dict[str, List[TestCase]] = defaultdict(list)
+for _t in TEST_CASES:
+    TESTS_BY_DIFF[_t.difficulty].append(_t)
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # TEST RUNNER
 # ═══════════════════════════════════════════════════════════════════════════════
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class TestResult:
     test_id: str
     name: str
@@ -375,60 +392,119 @@ class TestResult:
     success: bool
     time_sec: float
     error: Optional[str] = None
-
-def run_test(test: TestCase, agent_cmd: List[str], timeout: int = 180) -> TestResult:
-    """Run a single test case"""
-    print(f"\n{'─'*60}")
-    print(f"TEST: {test.id} - {test.name} [{test.difficulty}]")
-    print(f"{'─'*60}")
+    exit_code: Optional[int] = None  # agent's exit status; None if it never finished
+    cached: bool = False  # replayed from the result cache, not run this time
+
+_PRINT_LOCK = threading.Lock()
+_TOOL_MARK = "⚡".encode()  # agents print this once per tool call
+
+# Temp dirs are deleted in the background so a test returns (and the next one starts) right away;
+# the pool is drained at exit so nothing is left behind
+_CLEANUP_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="rmtree")
+atexit.register(_CLEANUP_POOL.shutdown, wait=True)
+
+# Each test's setup files are encoded once; every (agent, test) run just writes the bytes out
+_SETUP_PAYLOADS: Dict[str, List[tuple]] = {}
+_SETUP_LOCK = threading.Lock()
+
+def _setup_payload(test: TestCase) -> List[tuple]:
+    with _SETUP_LOCK:
+        if test.id not in _SETUP_PAYLOADS:
+            _SETUP_PAYLOADS[test.id] = [(name, content.encode()) for name, content in test.setup_files.items()]
+        return _SETUP_PAYLOADS[test.id]
+
+def _write_setup(payload: List[tuple], dest: str):
+    """One open + write per file, in process: for a few KB this beats cloning a template dir
+    with a `cp` subprocess, whose fork/exec alone costs more than the writes."""
+    for name, data in payload:
+        with open(os.path.join(dest, name), "wb") as f:
+            f.write(data)
+
+def agent_env() -> Dict[str, str]:
+    """Environment for agent subprocesses: ours plus VERBOSE, so tool calls get printed"""
+    return {**os.environ, "VERBOSE": "1"}
+
+def run_test(test: TestCase, agent_cmd: List[str], timeout: int = 180,
+             env: Dict[str, str] = None) -> TestResult:
+    """Run a single test case. Output is buffered and printed in one piece at the end,
+    so tests running side by side don't interleave their logs."""
+    log = []
+    log.append(f"\n{'─'*60}")
+    log.append(f"TEST: {test.id} - {test.name} [{test.difficulty}]")
+    log.append(f"{'─'*60}")
 
     # Create temp directory
     test_dir = tempfile.mkdtemp(prefix=f"swe_{test.id}_")
 
     try:
         # Setup files
-        for name, content in test.setup_files.items():
-            (Path(test_dir) / name).write_text(content)
+        _write_setup(_setup_payload(test), test_dir)
 
         # Run agent
         start = time.time()
-        print(f"Running agent...")
+        log.append(f"Running agent...")
 
-        result = subprocess.run(
+        # Agent output is only scanned for tool-call markers, line by line as it arrives,
+        # so a chatty VERBOSE agent never has its whole log held in memory
+        proc = subprocess.Popen(
             agent_cmd + [test.prompt],
-            capture_output=True,
-            text=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
             cwd=test_dir,
-            timeout=timeout,
-            env={**os.environ, "VERBOSE": "1"}
+            env=env or agent_env(),
+            start_new_session=True
         )
+        timed_out = threading.Event()
+
+        def kill():
+            # The whole group: tool commands the agent spawned would otherwise keep the pipe open
+            timed_out.set()
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+        watchdog = threading.Timer(timeout, kill)
+        watchdog.start()
+        tool_calls, tail = 0, b""
+        try:
+            # Count the marker on raw bytes, no decoding; the 2-byte tail catches one split across reads
+            for chunk in iter(lambda: proc.stdout.read1(65536), b""):
+                tool_calls += (tail + chunk).count(_TOOL_MARK)
+                tail = (tail + chunk)[-2:]
+            proc.wait()
+        finally:
+            watchdog.cancel()
+            proc.stdout.close()
+        if timed_out.is_set():
+            raise subprocess.TimeoutExpired(agent_cmd, timeout)
 
         elapsed = time.time() - start
 
         # Count tool calls
-        tool_calls = result.stdout.count("⚡") + result.stderr.count("⚡")
-        print(f"Agent finished in {elapsed:.1f}s ({tool_calls} tool calls)")
+        log.append(f"Agent finished in {elapsed:.1f}s ({tool_calls} tool calls)")
 
         # Validate
-        print(f"Validating: {test.validation_cmd}")
+        log.append(f"Validating: {test.validation_cmd}")
         val_result = subprocess.run(
             test.validation_cmd,
             shell=True,
             capture_output=True,
-            text=True,
             cwd=test_dir,
             timeout=30
         )
 
-        output = val_result.stdout + val_result.stderr
-        success = test.expected_output in output
+        # Matched on bytes; only the excerpt shown on failure gets decoded
+        raw = val_result.stdout + val_result.stderr
+        success = test.expected_output.encode() in raw
+        output = "" if success else raw[:500].decode("utf-8", "replace")
 
         if success:
-            print(f"✅ PASSED")
+            log.append(f"✅ PASSED")
         else:
-            print(f"❌ FAILED")
-            print(f"Expected '{test.expected_output}' in output:")
-            print(output[:500])
+            log.append(f"❌ FAILED")
+            log.append(f"Expected '{test.expected_output}' in output:")
+            log.append(output[:500])
 
         return TestResult(
             test_id=test.id,
@@ -436,22 +512,88 @@ def run_test(test: TestCase, agent_cmd: List[str], timeout: int = 180) -> TestRe
             difficulty=test.difficulty,
             success=success,
             time_sec=elapsed,
-            error=None if success else output[:200]
+            error=None if success else output[:200],
+            exit_code=proc.returncode
         )
 
     except subprocess.TimeoutExpired:
-        print(f"❌ TIMEOUT after {timeout}s")
+        log.append(f"❌ TIMEOUT after {timeout}s")
         return TestResult(test.id, test.name, test.difficulty, False, timeout, "Timeout")
     except Exception as e:
-        print(f"❌ ERROR: {e}")
+        log.append(f"❌ ERROR: {e}")
         return TestResult(test.id, test.name, test.difficulty, False, 0, str(e))
     finally:
-        shutil.rmtree(test_dir, ignore_errors=True)
+        _CLEANUP_POOL.submit(shutil.rmtree, test_dir, ignore_errors=True)
+        with _PRINT_LOCK:
+            print("\n".join(log), flush=True)
 
-def run_suite(agent_cmd: List[str], tests: List[TestCase] = None) -> Dict[str, Any]:
-    """Run test suite and return results"""
+# Results keyed by (agent file contents, model settings, test inputs); a hit skips the agent run entirely
+RESULT_CACHE = Path.home() / ".cache" / "nano_opencode" / "swe_results.json"
+_CACHE_LOCK = threading.Lock()
+
+def load_result_cache(path: Path = RESULT_CACHE) -> Dict[str, Dict]:
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+
+def save_result_cache(cache: Dict[str, Dict], path: Path = RESULT_CACHE):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(cache, indent=2))
+    os.replace(tmp, path)  # readers never see a half-written file
+
+# Settings the agents read that change their answers, so part of the cache key
+_CACHE_ENV = ("MODEL", "ANTHROPIC_BASE_URL", "MAX_TOKENS", "MAX_TURNS")
+
+def agent_digest(agent_cmd: List[str], env: Dict[str, str]) -> str:
+    """Hash of the agent command, the script or binary it runs (its last element) and the
+    model settings in env"""
+    h = hashlib.sha256("\0".join(agent_cmd + [env.get(k, "") for k in _CACHE_ENV]).encode())
+    try:
+        h.update(Path(agent_cmd[-1]).read_bytes())
+    except OSError:
+        pass
+    return h.hexdigest()
+
+def _cache_key(test: TestCase, agent: str) -> str:
+    parts = [agent, test.id, test.prompt, json.dumps(test.setup_files, sort_keys=True),
+             test.validation_cmd, test.expected_output]
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+def _cacheable(r: TestResult) -> bool:
+    """Any outcome of an agent run that exited cleanly, pass or fail; crashes, timeouts and
+    harness errors are retried next time"""
+    return r.exit_code == 0
+
+def run_suite(agent_cmd: List[str], tests: List[TestCase] = None, timeout: int = 180,
+              jobs: int = 0, cache: Dict[str, Dict] = None) -> Dict[str, Any]:
+    """Run test suite and return results. Each test is its own agent subprocess in its own
+    temp dir, so up to `jobs` of them (default: one per CPU) run at once. With a `cache`,
+    tests whose agent and inputs are unchanged replay the stored outcome as-is, marked cached."""
     tests = tests or TEST_CASES
-    results = [run_test(t, agent_cmd) for t in tests]
+    jobs = jobs or min(len(tests), os.cpu_count() or 1)
+    env = agent_env()  # one copy of os.environ for the whole suite, not one per test
+    agent = agent_digest(agent_cmd, env) if cache is not None else ""
+
+    def run_cached(test: TestCase) -> TestResult:
+        if cache is None:
+            return run_test(test, agent_cmd, timeout, env)
+        key = _cache_key(test, agent)
+        if key in cache:
+            r = replace(TestResult(**cache[key]), cached=True)
+            with _PRINT_LOCK:
+                print(f"\n{test.id}: cached {'✅ PASSED' if r.success else '❌ FAILED'} ({r.time_sec:.1f}s)")
+            return r
+        r = run_test(test, agent_cmd, timeout, env)
+        if _cacheable(r):
+            with _CACHE_LOCK:
+                cache[key] = asdict(r)  # stored with cached=False; replay sets it
+                save_result_cache(cache)
+        return r
+
+    with ThreadPoolExecutor(max_workers=jobs) as ex:
+        results = list(ex.map(run_cached, tests))
 
     passed = sum(1 for r in results if r.success)
     total_time = sum(r.time_sec for r in results)
@@ -468,47 +610,71 @@ def run_suite(agent_cmd: List[str], tests: List[TestCase] = None) -> Dict[str, A
         "total": len(results),
         "passed": passed,
         "failed": len(results) - passed,
+        "cached": sum(1 for r in results if r.cached),
         "pass_rate": passed / len(results) * 100,
         "total_time": total_time,
         "avg_time": total_time / len(results),
         "by_difficulty": by_diff,
-        "results": [{"id": r.test_id, "success": r.success, "time": r.time_sec} for r in results]
+        "results": [{"id": r.test_id, "success": r.success, "time": r.time_sec, "cached": r.cached}
+                    for r in results]
     }
 
-def print_summary(data: Dict[str, Any], agent: str):
-    """Print results summary"""
-    print(f"""
+def _pass_rate(item) -> float:
+    """Sort key for (agent, data) pairs"""
+    return item[1].get("pass_rate", 0)
+
+def _ratio(d: Optional[Dict[str, int]]) -> str:
+    """"passed/total" for one difficulty bucket, "-" if it had no tests"""
+    return f"{d['passed']}/{d['total']}" if d and d["total"] > 0 else "-"
+
+# Templates are parsed once; print_summary fills them with format_map and prints in one write
+_SUMMARY_HEAD = """
 ╔══════════════════════════════════════════════════════════════════════╗
 ║  SWE-BENCH TEST RESULTS: {agent:<42} ║
 ╠══════════════════════════════════════════════════════════════════════╣
-║  Total: {data['total']:<5} │ Passed: {data['passed']:<5} │ Failed: {data['failed']:<5} │ Rate: {data['pass_rate']:>5.1f}% ║
-║  Time:  {data['total_time']:.1f}s total │ {data['avg_time']:.1f}s average{' '*27} ║
-╠══════════════════════════════════════════════════════════════════════╣""")
+║  Total: {total:<5} │ Passed: {passed:<5} │ Failed: {failed:<5} │ Rate: {pass_rate:>5.1f}% ║
+║  Time:  {total_time:.1f}s total │ {avg_time:.1f}s average""" + " " * 27 + """ ║
+╠══════════════════════════════════════════════════════════════════════╣"""
+_SUMMARY_DIFF = "║  {label:<8} {passed}/{total} {bar} {pct:>5.1f}%" + " " * 26 + " ║"
+_SUMMARY_SEP = "╠══════════════════════════════════════════════════════════════════════╣"
+_SUMMARY_ROW = "║  {status} {id:<12} {time:>6.1f}s" + " " * 43 + " ║"
+_SUMMARY_FOOT = "╚══════════════════════════════════════════════════════════════════════╝"
+
+def print_summary(data: Dict[str, Any], agent: str):
+    """Print results summary"""
+    lines = [_SUMMARY_HEAD.format_map({**data, "agent": agent})]
 
     for diff in ["easy", "medium", "hard"]:
         if diff in data["by_difficulty"]:
             d = data["by_difficulty"][diff]
             pct = d["passed"] / d["total"] * 100 if d["total"] > 0 else 0
             bar = "█" * int(pct / 10) + "░" * (10 - int(pct / 10))
-            print(f"║  {diff.capitalize():<8} {d['passed']}/{d['total']} {bar} {pct:>5.1f}%{' '*26} ║")
+            lines.append(_SUMMARY_DIFF.format_map({**d, "label": diff.capitalize(), "bar": bar, "pct": pct}))
 
-    print("╠══════════════════════════════════════════════════════════════════════╣")
+    lines.append(_SUMMARY_SEP)
     for r in data["results"]:
-        status = "✅" if r["success"] else "❌"
-        print(f"║  {status} {r['id']:<12} {r['time']:>6.1f}s{' '*43} ║")
-    print("╚══════════════════════════════════════════════════════════════════════╝")
+        lines.append(_SUMMARY_ROW.format_map({**r, "status": "✅" if r["success"] else "❌"}))
+    lines.append(_SUMMARY_FOOT)
+    print("\n".join(lines))
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # MAIN
 # ═══════════════════════════════════════════════════════════════════════════════
 
+def _stale(bin_path: Path, src_dir: Path, *globs: str) -> bool:
+    """True if bin_path is missing or older than any source matching globs under src_dir"""
+    if not bin_path.exists():
+        return True
+    built = bin_path.stat().st_mtime
+    return any(src.stat().st_mtime > built for g in globs for src in src_dir.glob(g))
+
 def build_agents(script_dir: Path) -> Dict[str, bool]:
-    """Build compiled agents (Go, Rust, Zig, C)"""
+    """Build compiled agents (Go, Rust, Zig, C); toolchains only run for binaries older than their sources"""
     builds = {}
 
     # Go
     go_dir = script_dir / "go"
-    if (go_dir / "nano.go").exists():
+    if (go_dir / "nano.go").exists() and _stale(go_dir / "nano", go_dir, "*.go", "go.mod"):
         print("Building Go agent...")
         result = subprocess.run(["go", "build", "-o", "nano", "nano.go"],
                               cwd=go_dir, capture_output=True)
@@ -517,10 +683,13 @@ def build_agents(script_dir: Path) -> Dict[str, bool]:
             print("  ✅ Go built successfully")
         else:
             print(f"  ❌ Go build failed: {result.stderr.decode()[:200]}")
+    else:
+        builds["go"] = (go_dir / "nano").exists()
 
     # Rust
     rust_dir = script_dir / "rust"
-    if (rust_dir / "Cargo.toml").exists():
+    rust_bin = rust_dir / "target" / "release" / "nano-opencode"
+    if (rust_dir / "Cargo.toml").exists() and _stale(rust_bin, rust_dir, "src/**/*.rs", "Cargo.toml", "Cargo.lock"):
         print("Building Rust agent...")
         result = subprocess.run(["cargo", "build", "--release"],
                               cwd=rust_dir, capture_output=True, timeout=120)
@@ -529,10 +698,13 @@ def build_agents(script_dir: Path) -> Dict[str, bool]:
             print("  ✅ Rust built successfully")
         else:
             print(f"  ❌ Rust build failed: {result.stderr.decode()[:200]}")
+    else:
+        builds["rust"] = rust_bin.exists()
 
     # Zig
     zig_dir = script_dir / "zig"
-    if (zig_dir / "nano.zig").exists() and not (zig_dir / "zig-out" / "bin" / "nano").exists():
+    zig_bin = zig_dir / "zig-out" / "bin" / "nano"
+    if (zig_dir / "nano.zig").exists() and _stale(zig_bin, zig_dir, "*.zig"):
         print("Building Zig agent...")
         result = subprocess.run(["zig", "build", "-Doptimize=ReleaseFast"],
                               cwd=zig_dir, capture_output=True, timeout=120)
@@ -542,11 +714,11 @@ def build_agents(script_dir: Path) -> Dict[str, bool]:
         else:
             print(f"  ❌ Zig build failed: {result.stderr.decode()[:200]}")
     else:
-        builds["zig"] = (zig_dir / "zig-out" / "bin" / "nano").exists()
+        builds["zig"] = zig_bin.exists()
 
     # C
     c_dir = script_dir / "c"
-    if (c_dir / "nano.c").exists() and not (c_dir / "nano").exists():
+    if (c_dir / "nano.c").exists() and _stale(c_dir / "nano", c_dir, "*.c", "*.h", "Makefile"):
         print("Building C agent...")
         result = subprocess.run(["make"], cwd=c_dir, capture_output=True)
         builds["c"] = result.returncode == 0
@@ -646,6 +818,9 @@ def main():
     parser.add_argument("--test", help="Run specific test ID")
     parser.add_argument("--output", "-o", help="Save JSON results")
     parser.add_argument("--timeout", type=int, default=180, help="Timeout per test in seconds")
+    parser.add_argument("--jobs", "-j", type=int, default=0, help="Tests to run at once (default: one per CPU)")
+    parser.add_argument("--cache", action="store_true",
+                        help=f"Replay stored outcomes from {RESULT_CACHE} for unchanged agent/test pairs")
     args = parser.parse_args()
 
     script_dir = Path(__file__).parent
@@ -683,9 +858,13 @@ def main():
     # Filter tests
     tests = TEST_CASES
     if args.test:
-        tests = [t for t in tests if t.id == args.test]
+        if args.test not in TESTS_BY_ID:
+            print(f"Unknown test: {args.test}")
+            print(f"Available: {', '.join(TESTS_BY_ID)}")
+            sys.exit(1)
+        tests = [TESTS_BY_ID[args.test]]
     if args.difficulty:
-        tests = [t for t in tests if t.difficulty == args.difficulty]
+        tests = [t for t in tests if t.difficulty == args.difficulty] if args.test else TESTS_BY_DIFF[args.difficulty]
 
     # Show test plan
     print("\n" + "="*70)
@@ -697,6 +876,7 @@ def main():
     print("="*70)
 
     all_results = {}
+    cache = load_result_cache() if args.cache else None
 
     for name in agent_list:
         agent = all_agents[name]
@@ -712,7 +892,7 @@ def main():
         print(f"{'#'*70}")
 
         try:
-            data = run_suite(agent["cmd"], tests)
+            data = run_suite(agent["cmd"], tests, args.timeout, args.jobs, cache)
             data["agent"] = name
             data["lang"] = agent["lang"]
             data["type"] = agent["type"]
@@ -746,14 +926,9 @@ def main():
 ║  Agent      │ Lang       │ Tools │ Type    │ Pass % │ Avg Time │ E  │ M  │ H   ║
 ╠═════════════╪════════════╪═══════╪═════════╪════════╪══════════╪════╪════╪═════╣""")
 
-        for name, d in sorted(all_results.items(), key=lambda x: -x[1].get("pass_rate", 0)):
-            easy = d.get("by_difficulty", {}).get("easy", {"passed": 0, "total": 0})
-            med = d.get("by_difficulty", {}).get("medium", {"passed": 0, "total": 0})
-            hard = d.get("by_difficulty", {}).get("hard", {"passed": 0, "total": 0})
-
-            e_str = f"{easy['passed']}/{easy['total']}" if easy['total'] > 0 else "-"
-            m_str = f"{med['passed']}/{med['total']}" if med['total'] > 0 else "-"
-            h_str = f"{hard['passed']}/{hard['total']}" if hard['total'] > 0 else "-"
+        for name, d in sorted(all_results.items(), key=_pass_rate, reverse=True):
+            by_diff = d.get("by_difficulty", {})
+            e_str, m_str, h_str = (_ratio(by_diff.get(diff)) for diff in ("easy", "medium", "hard"))
 
             print(f"║  {name:<10} │ {d.get('lang', '?'):<10} │ {d.get('tools', '?'):>5} │ {d.get('type', '?'):<7} │ {d.get('pass_rate', 0):>5.1f}% │ {d.get('avg_time', 0):>7.1f}s │ {e_str:<2} │ {m_str:<2} │ {h_str:<3} ║")
 
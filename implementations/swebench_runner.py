@@ -11,6 +11,7 @@ import os
 import re
 import subprocess
 import sys
+import tempfile
 import time
 from dataclasses import dataclass
 from pathlib import Path
@@ -19,22 +20,12 @@ from typing import Any, Callable
 import litellm
 from datasets import load_dataset
 
+from _env import load_api_config
+
 # Configure LiteLLM
 litellm.set_verbose = False
 
 # Load API configuration from mini-swe-agent config if available
-def load_api_config():
-    """Load API config from mini-swe-agent .env file."""
-    config_path = Path.home() / ".config" / "mini-swe-agent" / ".env"
-    config = {}
-    if config_path.exists():
-        for line in config_path.read_text().splitlines():
-            if '=' in line and not line.startswith('#'):
-                key, value = line.split('=', 1)
-                config[key.strip()] = value.strip()
-                os.environ[key.strip()] = value.strip()
-    return config
-
 API_CONFIG = load_api_config()
 
 # Configuration
@@ -94,10 +85,26 @@ class DockerEnv:
 
     def write_file(self, path: str, content: str) -> str:
         """Write a file to the container."""
-        # Escape content for shell
-        escaped = content.replace("'", "'\"'\"'")
-        result = self.execute(f"cat > '{path}' << 'NANOEOF'\n{content}\nNANOEOF")
-        return "File written successfully" if result["returncode"] == 0 else f"Error: {result['output']}"
+        # docker cp streams the file through the daemon instead of a shell heredoc
+        dest = path if path.startswith("/") else f"{self.workdir}/{path}"
+        with tempfile.NamedTemporaryFile("w", delete=False) as tf:
+            tf.write(content)
+        try:
+            # docker cp applies the host file's mode; keep the existing file's so the patch has no mode change
+            mode = subprocess.run(
+                ["docker", "exec", self.container_id, "stat", "-c", "%a", dest],
+                capture_output=True, text=True, timeout=self.timeout
+            )
+            os.chmod(tf.name, int(mode.stdout, 8) if mode.returncode == 0 else 0o644)
+            result = subprocess.run(
+                ["docker", "cp", tf.name, f"{self.container_id}:{dest}"],
+                capture_output=True, text=True, timeout=self.timeout
+            )
+        except subprocess.TimeoutExpired:
+            return f"Error: Timeout after {self.timeout}s"
+        finally:
+            os.unlink(tf.name)
+        return "File written successfully" if result.returncode == 0 else f"Error: {result.stdout + result.stderr}"
 
     def list_files(self, path: str = ".") -> str:
         """List files in directory."""
@@ -454,14 +461,16 @@ def main():
     # Load dataset
     dataset_path = DATASET_MAPPING[args.subset]
     print(f"Loading {dataset_path} split={args.split}...")
-    instances = list(load_dataset(dataset_path, split=args.split))
-    print(f"Loaded {len(instances)} instances")
+    ds = load_dataset(dataset_path, split=args.split)
+    print(f"Loaded {len(ds)} instances")
 
-    # Apply slice
+    # Apply slice before decoding so only the selected rows are materialized
+    rows = range(len(ds))
     if args.slice:
         parts = [int(x) if x else None for x in args.slice.split(":")]
-        instances = instances[slice(*parts)]
-        print(f"Sliced to {len(instances)} instances")
+        rows = rows[slice(*parts)]
+        print(f"Sliced to {len(rows)} instances")
+    instances = [ds[i] for i in rows]
 
     # Skip existing
     preds_file = output_dir / "preds.json"